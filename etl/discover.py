@@ -2,8 +2,9 @@
 
 import argparse
 import logging
+import os
 from pathlib import Path
-from typing import Generator, List, Union
+from typing import Generator, Iterable, List, Union
 
 LOGGER = logging.getLogger(__name__)
 logging.basicConfig(
@@ -12,6 +13,51 @@ logging.basicConfig(
 )
 
 
+# Directory-backed stores: discover_files() yields these whole.
+STORE_SUFFIXES = (".zarr",)
+
+
+def scandir_files(
+    root: Union[str, Path],
+    suffixes: Iterable[str],
+    dir_suffixes: Iterable[str] = (),
+) -> Generator[os.DirEntry, None, None]:
+    """
+    Walk `root` with an explicit stack of `os.scandir` calls and yield every
+    file whose name ends with one of `suffixes`.
+
+    `DirEntry` caches the file type reported by the directory listing, so
+    unlike `Path.rglob` no extra `stat()` is issued per entry.  Symlinked
+    directories are not followed.  Only a directory matching `dir_suffixes`
+    (e.g. a `.zarr` store) is yielded, whole and never descended into, so its
+    chunk files are not listed; any other directory is walked, whatever its
+    name.  A missing `root` yields nothing.
+    """
+    suffixes = tuple(suffixes)
+    dir_suffixes = tuple(dir_suffixes)
+    root = os.fspath(root)
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if dir_suffixes and entry.name.endswith(dir_suffixes):
+                            yield entry
+                        else:
+                            stack.append(entry.path)
+                    elif entry.name.endswith(suffixes) and entry.is_file():
+                        yield entry
+        except FileNotFoundError:
+            if current == root:
+                LOGGER.warning("Directory %s does not exist", root)
+                return
+            LOGGER.warning("Directory vanished while scanning: %s", current)
+        except OSError as exc:
+            LOGGER.warning("Cannot scan %s: %s", current, exc)
+
+
 def discover_files(
     data_dir: Union[str, Path],
     extensions: List[str] = None
@@ -22,19 +68,18 @@ def discover_files(
     :param data_dir: Root directory to scan.
     :param extensions: List of file extensions to include (e.g. ['.tsv', '.zarr']).
                        If None, defaults to ['.tsv', '.zarr'].
-    :yield: Path objects for each matching file.
+    :yield: Path objects for each matching file (or `.zarr` store directory).
     """
     base = Path(data_dir).expanduser().resolve()
     if extensions is None:
         extensions = ['.tsv', '.zarr']
 
     LOGGER.info("🔍 Discovering files in %s with extensions %s", base, extensions)
-    for ext in extensions:
-        pattern = f"*{ext}"
-        for path in base.rglob(pattern):
-            if path.is_file():
-                LOGGER.debug("Found file: %s", path)
-                yield path
+    # one pass over the tree for all extensions (rglob walked it once per ext)
+    stores = [ext for ext in extensions if ext in STORE_SUFFIXES]
+    for entry in scandir_files(base, extensions, stores):
+        LOGGER.debug("Found: %s", entry.path)
+        yield Path(entry.path)
 
 
 def main() -> None:
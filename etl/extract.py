@@ -30,8 +30,20 @@ import csv
 import itertools
 import logging
 import pathlib
+import queue
+import threading
 from typing import Dict, Generator, Iterable, List, Tuple
 
+from etl.discover import scandir_files
+
+# Optional fast path: Arrow's multithreaded C++ CSV parser.  Without it we
+# fall back to the stdlib csv.DictReader.
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:                                   # pragma: no cover
+    pa = pacsv = None
+
 LOGGER = logging.getLogger(__name__)
 logging.basicConfig(
     level=logging.INFO,
@@ -70,6 +82,10 @@ TABLE_PRIORITY = {
     "MicrobeStimulus":   9,
 }
 
+# end-of-stream marker for the prefetch queue in Extractor.iter_batches
+_SENTINEL = object()
+
+
 def _table_for(fname: str) -> str | None:
     """Return the warehouse table indicated by *fname*, or None if unknown."""
     for pattern, table in _TABLE_MAP:
@@ -96,6 +112,8 @@ class Extractor:
         'all' → everything
     batch_size :
         How many rows to emit per `(table, rows)` batch.
+    prefetch :
+        How many batches the background reader may run ahead of the consumer.
     """
 
     #: recognised operating modes
@@ -106,12 +124,14 @@ class Extractor:
         data_dir: str | pathlib.Path,
         mode: str = "all",
         batch_size: int = 1_000,
+        prefetch: int = 2,
     ):
         self.data_dir = pathlib.Path(data_dir).expanduser().resolve()
         if mode not in self._MODES:
             raise ValueError(f"Unsupported mode '{mode}'. Choose from {self._MODES}.")
         self.mode = mode
         self.batch_size = batch_size
+        self.prefetch = prefetch
 
     # ────────────────────────────────────────────────────────────────────
     # Public iterator
@@ -127,39 +147,71 @@ class Extractor:
         # for i, tmp_file in enumerate(files):
         #     LOGGER.debug(f"\n\t\t------> {i}.\t{tmp_file}")
 
-        LOGGER.debug(f"iter_batches: {len(files)} files selected (mode={self.mode})")
-        for fpath in files:
-            table = _table_for(fpath.name)
-            if table is None:
-                LOGGER.debug("Skipping unrecognised file %s", fpath)
-                continue
-            if table in ("RawCounts",):
-                LOGGER.debug("Skipping raw counts file %s", fpath)
-                continue
-
-            LOGGER.info("⏳  Extracting %s → %s", fpath.name, table)
-            for batch in self._read_file(fpath, table):
-                LOGGER.debug("  yielding batch of %d rows from %s", len(batch), fpath.name)
-                yield table, batch
-
-            LOGGER.info("✅  Finished %s", fpath.name)
+        LOGGER.debug("iter_batches: %d files selected (mode=%s)", len(files), self.mode)
+        # batches are produced on a background thread (see _produce), so the
+        # next file is opened and parsed while the caller consumes this one
+        q: queue.Queue = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        worker = threading.Thread(
+            target=self._produce, args=(files, q, stop), name="extract-prefetch", daemon=True
+        )
+        worker.start()
+        try:
+            while (item := q.get()) is not _SENTINEL:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # consumer stopped early (or raised): let the producer exit
+            stop.set()
+            worker.join()
+
+    def _produce(self, files: List[pathlib.Path], q: queue.Queue, stop: threading.Event) -> None:
+        """Feed `(table, batch)` tuples into *q*, then `_SENTINEL` (or the exception raised)."""
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for fpath in files:
+                table = _table_for(fpath.name)
+                if table is None:
+                    LOGGER.debug("Skipping unrecognised file %s", fpath)
+                    continue
+                if table in ("RawCounts",):
+                    LOGGER.debug("Skipping raw counts file %s", fpath)
+                    continue
+
+                LOGGER.info("⏳  Extracting %s → %s", fpath.name, table)
+                for batch in self._read_file(fpath, table):
+                    LOGGER.debug("  yielding batch of %d rows from %s", len(batch), fpath.name)
+                    if not put((table, batch)):
+                        return
+
+                LOGGER.info("✅  Finished %s", fpath.name)
+        except BaseException as exc:  # re-raised in the consuming thread
+            put(exc)
+            return
+        put(_SENTINEL)
 
     # ────────────────────────────────────────────────────────────────────
     # File scanning
     # ────────────────────────────────────────────────────────────────────
     def _select_files(self) -> List[pathlib.Path]:
-        # all_files = sorted(self.data_dir.rglob("*.tsv"))
-        # LOGGER.debug("_select_files: found %d TSV files under %s", len(all_files), self.data_dir)
-
-        all_files = list(self.data_dir.rglob("*.tsv"))
-        if self.mode == "all":
-            files = all_files
-        elif self.mode == "metadata":
-            files = [p for p in all_files if not p.name.endswith("_raw_counts.tsv")]
-        else:
-            files = [p for p in all_files if p.name.endswith("_raw_counts.tsv")]
+        # scandir walk instead of rglob: no per-entry stat(), and the mode
+        # filter runs on the cached entry name before any Path is built
+        entries = scandir_files(self.data_dir, (".tsv",))
+        if self.mode == "metadata":
+            entries = (e for e in entries if not e.name.endswith("_raw_counts.tsv"))
+        elif self.mode == "raw_counts":
+            entries = (e for e in entries if e.name.endswith("_raw_counts.tsv"))
 
-        return files
+        return [pathlib.Path(e.path) for e in entries]
 
     # ────────────────────────────────────────────────────────────────────
     # File reader → batches
@@ -172,21 +224,96 @@ class Extractor:
         A `sample_id` field is injected for raw-counts rows.
         """
         LOGGER.debug("_read_file: opening %s for table %s", path, table)
+        sample_id = None
+        if table == "RawCounts":
+            # infer sample_id from filename prefix
+            sample_id = path.stem.replace("_raw_counts", "")
+
+        if pacsv is not None:
+            yield from self._read_file_arrow(path, sample_id)
+        else:
+            yield from self._read_file_csv(path, sample_id)
+
+    def _read_file_arrow(
+        self, path: pathlib.Path, sample_id: str | None
+    ) -> Generator[List[Dict], None, None]:
+        """
+        PyArrow reader: parses whole blocks in C++ and hands back row-dicts via
+        `RecordBatch.to_pylist()`.  Every column is read as a string so the
+        rows are identical to what `csv.DictReader` produces.
+
+        Arrow rejects ragged rows (too few / too many fields) that DictReader
+        pads with None or keeps under the None key; on such a file the rest
+        is re-read with `_read_file_csv`, resuming after the rows already
+        yielded.
+        """
+        with path.open(newline="") as fh:
+            header = next(csv.reader(fh, delimiter="\t"), None)
+        if not header:
+            return
+
+        emitted = 0  # rows already handed to the consumer
+        batch: List[Dict] = []
+        try:
+            for rows in self._arrow_batches(path, header, sample_id):
+                offset = 0
+                while offset < len(rows):
+                    room = self.batch_size - len(batch)
+                    batch.extend(rows[offset:offset + room])
+                    offset += room
+                    if len(batch) >= self.batch_size:
+                        LOGGER.debug("  _read_file: batch full (%d rows), yielding", len(batch))
+                        emitted += len(batch)
+                        yield batch
+                        batch = []
+        except pa.ArrowInvalid as exc:
+            LOGGER.warning("Arrow could not parse %s (%s); falling back to csv", path.name, exc)
+            yield from self._read_file_csv(path, sample_id, skip=emitted)
+            return
+        if batch:
+            LOGGER.debug("  _read_file: final batch (%d rows), yielding", len(batch))
+            yield batch
+
+    @staticmethod
+    def _arrow_batches(
+        path: pathlib.Path, header: List[str], sample_id: str | None
+    ) -> Generator[List[Dict], None, None]:
+        """Row-dicts of each Arrow record batch; raises `pa.ArrowInvalid` on ragged rows."""
+        reader = pacsv.open_csv(
+            str(path),
+            read_options=pacsv.ReadOptions(block_size=8 << 20),
+            parse_options=pacsv.ParseOptions(delimiter="\t"),
+            convert_options=pacsv.ConvertOptions(
+                column_types={name: pa.string() for name in header},
+            ),
+        )
+        for record_batch in reader:
+            if sample_id is not None:
+                # prepend FK column
+                record_batch = pa.RecordBatch.from_arrays(
+                    [pa.array([sample_id] * record_batch.num_rows, pa.string()),
+                     *record_batch.columns],
+                    names=["sample_id", *record_batch.schema.names],
+                )
+            yield record_batch.to_pylist()
+
+    def _read_file_csv(
+        self, path: pathlib.Path, sample_id: str | None, skip: int = 0
+    ) -> Generator[List[Dict], None, None]:
+        """
+        Pure-Python reader, used when pyarrow is not installed or cannot parse
+        the file.  The first *skip* data rows are not yielded.
+        """
         with path.open(newline="") as fh:
 
             reader = csv.DictReader(fh, delimiter="\t")
             batch: List[Dict] = []
-            sample_id = None
 
-            if table == "RawCounts":
-                # infer sample_id from filename prefix
-                sample_id = path.stem.replace("_raw_counts", "")
-
-            for row in reader:
+            for row in itertools.islice(reader, skip, None):
                 # count each row read
                 if len(batch) == 0:
                     LOGGER.debug("  _read_file: starting new batch for %s", path.name)
-                if table == "RawCounts":
+                if sample_id is not None:
                     row = {"sample_id": sample_id, **row}  # prepend FK
 
                 batch.append(row)
@@ -199,7 +326,6 @@ class Extractor:
                 yield batch
 
 
-
 # ───────────────────────────────────────────────────────────────────────────
 # CLI entry-point
 # ───────────────────────────────────────────────────────────────────────────
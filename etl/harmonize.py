@@ -20,16 +20,50 @@ from __future__ import annotations
 
 import json
 import logging
+import os
 import random
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Callable, Dict, Iterable, List
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import quote_plus
+from urllib3.util.retry import Retry
 
 import yaml
 
+try:  # optional: C JSON codec, several times faster than the stdlib one
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:  # pragma: no cover
+    _loads = json.loads
+    _dumps = json.dumps
+
+try:  # libyaml-backed loader when PyYAML was built with it
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as _YamlLoader
+
+try:  # optional linear-time regex engine for the mapping rules
+    import re2
+except ImportError:  # pragma: no cover
+    re2 = None
+
+try:  # optional persistent response cache
+    import diskcache
+except ImportError:  # pragma: no cover
+    diskcache = None
+
 from etl.utils.preprocessing import TRANSFORM_REGISTRY as SIMPLE_REGISTRY
 from etl.utils.preprocessing import (
     canonical_iri,
@@ -144,14 +178,87 @@ def stub_fetch_sample_metadata(sample_id: str) -> dict:
 _H = {"User-Agent": "GutBrain-DW/0.1 (+https://example.org)"}
 TIMEOUT = 8
 
+# One pooled session: keep-alive connections to mygene.info, ebi.ac.uk,
+# ensembl.org and ncbi.nlm.nih.gov instead of a TCP+TLS handshake per lookup
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)),
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.headers.update(_H)
+
+
+# Successful GET responses, keyed by URL: in an LRU of the last
+# JSON_CACHE_SIZE responses for the run and, when `diskcache` is installed,
+# on disk across runs as (stored_at, json).  Failures are never stored, so a
+# timeout or 5xx is retried on the next lookup instead of sticking; while a
+# service is down, an expired disk entry is served (stale-on-error) rather
+# than dropping to the stub.  Cached documents are shared between callers:
+# treat what _safe_json() returns as read-only.
+CACHE_DIR = Path(os.getenv("ALETHIOMICS_CACHE_DIR", "~/.cache/alethiomics")).expanduser()
+CACHE_TTL = 30 * 24 * 3600  # seconds
+JSON_CACHE_SIZE = 2048
+_JSON_CACHE: "OrderedDict[str, Any]" = OrderedDict()
+_JSON_CACHE_LOCK = threading.Lock()  # fetchers run on the prefetch pool
+
+
+def _json_cache_get(url: str) -> Any:
+    with _JSON_CACHE_LOCK:
+        hit = _JSON_CACHE.get(url)
+        if hit is not None:
+            _JSON_CACHE.move_to_end(url)
+        return hit
+
+
+def _json_cache_put(url: str, j: Any) -> None:
+    with _JSON_CACHE_LOCK:
+        _JSON_CACHE[url] = j
+        _JSON_CACHE.move_to_end(url)
+        if len(_JSON_CACHE) > JSON_CACHE_SIZE:
+            _JSON_CACHE.popitem(last=False)
+
+
+@lru_cache(maxsize=None)
+def _disk_cache():
+    if diskcache is None:
+        return None
+    try:
+        return diskcache.Cache(str(CACHE_DIR / "http"), size_limit=2**32)
+    except Exception as exc:
+        logger.warning("HTTP cache disabled: %s", exc)
+        return None
+
 
 def _safe_json(url: str) -> dict | None:
+    """GET `url` as JSON through the caches above; None on failure.
+
+    The result may be a cached object shared with other callers: do not
+    mutate it.
+    """
+    hit = _json_cache_get(url)
+    if hit is not None:
+        return hit
+    disk = _disk_cache()
+    stored = disk.get(url) if disk is not None else None
+    if not isinstance(stored, tuple):
+        stored = None  # absent, or written by an older layout
+    if stored is not None and time.time() - stored[0] < CACHE_TTL:
+        _json_cache_put(url, stored[1])
+        return stored[1]
     try:
-        r = requests.get(url, headers=_H, timeout=TIMEOUT)
+        r = _SESSION.get(url, timeout=TIMEOUT)
         r.raise_for_status()
-        return r.json()
+        j = _loads(r.content)
     except Exception:
-        return None
+        return stored[1] if stored is not None else None
+    if j is not None:
+        _json_cache_put(url, j)
+        if disk is not None:
+            disk.set(url, (time.time(), j))
+    return j
 
 
 # ------------------------------------------------------------------------- #
@@ -159,11 +266,51 @@ def _safe_json(url: str) -> dict | None:
 # ------------------------------------------------------------------------- #
 
 
+_MYGENE_FIELDS = "symbol,name,genomic_pos,go"
+MYGENE_BATCH = 1000  # max ids per POST accepted by MyGene.info
+
+# MyGene.info documents by (version-less) accession, filled in bulk by
+# prefetch_gene_metadata(); None marks an id MyGene does not know
+_MYGENE_CACHE: Dict[str, dict | None] = {}
+
+
+def _safe_post_json(url: str, data: dict) -> Any:
+    try:
+        r = _SESSION.post(url, data=data, timeout=TIMEOUT)
+        r.raise_for_status()
+        return _loads(r.content)
+    except Exception:
+        return None
+
+
+def prefetch_gene_metadata(gene_accessions: Iterable[str]) -> None:
+    """
+    Resolve many accessions with one MyGene.info POST per MYGENE_BATCH ids
+    instead of one GET each; fetch_gene_metadata() then reads the cache.
+    """
+    todo = sorted({strip_version(g) for g in gene_accessions} - _MYGENE_CACHE.keys())
+    for start in range(0, len(todo), MYGENE_BATCH):
+        chunk = todo[start:start + MYGENE_BATCH]
+        hits = _safe_post_json(
+            "https://mygene.info/v3/gene",
+            {"ids": ",".join(chunk), "fields": _MYGENE_FIELDS},
+        )
+        if not isinstance(hits, list):
+            continue  # leave uncached; single lookups will retry
+        for hit in hits:
+            q = hit.get("query")
+            if q is not None and q not in _MYGENE_CACHE:
+                _MYGENE_CACHE[q] = None if hit.get("notfound") else hit
+
+
 def fetch_gene_metadata(gene_accession: str) -> Dict[str, Any]:
     g = strip_version(gene_accession)
 
     # 1️⃣ MyGene.info
-    j = _safe_json(f"https://mygene.info/v3/gene/{g}?fields=symbol,name,genomic_pos,go")
+    if g in _MYGENE_CACHE:
+        j = _MYGENE_CACHE[g]
+    else:
+        j = _safe_json(f"https://mygene.info/v3/gene/{g}?fields={_MYGENE_FIELDS}")
     if j:
         pos = j.get("genomic_pos", {})
         length = (
@@ -177,8 +324,8 @@ def fetch_gene_metadata(gene_accession: str) -> Dict[str, Any]:
             "species_taxon_id": 9606,
             "gene_length_bp": length or random.randint(500, 200_000),
             "gc_content_pct": _rand_gc(),
-            "pathway_iris": json.dumps([]),
-            "go_terms": json.dumps(list(j.get("go", {}).get("BP", []))),
+            "pathway_iris": "[]",
+            "go_terms": _dumps(list(j.get("go", {}).get("BP", []))),
         }
 
     # 2️⃣ Ensembl REST
@@ -191,8 +338,8 @@ def fetch_gene_metadata(gene_accession: str) -> Dict[str, Any]:
             "species_taxon_id": 9606,
             "gene_length_bp": length or random.randint(500, 200_000),
             "gc_content_pct": _rand_gc(),
-            "pathway_iris": json.dumps([]),
-            "go_terms": json.dumps([]),
+            "pathway_iris": "[]",
+            "go_terms": "[]",
         }
 
     # 3️⃣ Fallback stub
@@ -202,8 +349,8 @@ def fetch_gene_metadata(gene_accession: str) -> Dict[str, Any]:
         "species_taxon_id": 9606,
         "gene_length_bp": random.randint(500, 200_000),
         "gc_content_pct": _rand_gc(),
-        "pathway_iris": json.dumps([]),
-        "go_terms": json.dumps([]),
+        "pathway_iris": "[]",
+        "go_terms": "[]",
     }
 
 
@@ -359,7 +506,7 @@ def fetch_ontology_term_metadata(iri: str) -> Dict[str, Any]:
             "label": t.get("label"),
             "ontology": t.get("ontology_prefix"),
             "definition": (t.get("description") or [""])[0],
-            "synonyms": json.dumps(t.get("synonyms", [])),
+            "synonyms": _dumps(t.get("synonyms", [])),
             "version": t.get("ontology_version", ""),
         }
 
@@ -369,7 +516,7 @@ def fetch_ontology_term_metadata(iri: str) -> Dict[str, Any]:
         "label": iri.split("/")[-1],
         "ontology": "CL" if "CL_" in iri else "UBERON",
         "definition": "",
-        "synonyms": json.dumps([]),
+        "synonyms": "[]",
         "version": "2025-06",
     }
 
@@ -455,8 +602,26 @@ def fetch_sample_metadata(sample_id: str) -> Dict[str, Any]:
     
 
 # ----------------- Parsers for link / expression-stat rows -----------------
+_PAYLOAD_SEP_RE = re.compile(r"[:,]")
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def _compile_rule(pattern: str):
+    """
+    Compile a mapping regex with RE2 when it is installed (no backtracking),
+    else with `re`.  Patterns RE2 does not support (look-arounds,
+    back-references) fall back to `re`.
+    """
+    if re2 is not None:
+        try:
+            return re2.compile(pattern)
+        except Exception:
+            pass
+    return re.compile(pattern)
+
+
 def _split_payload(text: str) -> List[str]:
-    return re.split(r"[:,]", text, maxsplit=1)[-1].split(",")
+    return _PAYLOAD_SEP_RE.split(text, maxsplit=1)[-1].split(",")
 
 
 def parse_sample_microbe_record(text: str) -> Dict[str, Any]:
@@ -490,7 +655,8 @@ def parse_microbe_stimulus_record(text: str) -> Dict[str, Any]:
 
 
 def parse_expression_stat_record(text: str) -> Dict[str, Any]:
-    fields = text.split(":")[1].split(",")
+    # one partition instead of splitting on every ':' to take one piece
+    fields = text.partition(":")[2].split(",")
     return {
         "sample_id": fields[0],
         "gene_accession": strip_version(fields[1]),
@@ -529,12 +695,46 @@ _TRANSFORM_REGISTRY: Dict[str, Callable[..., Any]] = {
     "stub_fetch_sample_metadata": stub_fetch_sample_metadata
 }
 
+# fetchers whose cost is an HTTP round-trip; Harmonizer.apply resolves them
+# for a whole batch concurrently before the row loop
+_REMOTE_FETCHERS = frozenset({
+    fetch_stimulus_metadata,
+    fetch_microbe_metadata,
+    fetch_taxon_metadata,
+    fetch_ontology_term_metadata,
+    fetch_study_metadata,
+})
+HTTP_WORKERS = 16
+_POOL: ThreadPoolExecutor | None = None
+
+
+def _http_pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(max_workers=HTTP_WORKERS, thread_name_prefix="harmonize-http")
+    return _POOL
+
+
 # -------------------------------------------------------------------------
 #  Harmonizer class
 # -------------------------------------------------------------------------
+# parsed mapping catalogues keyed by (resolved path, mtime_ns); an edited
+# file gets a new key, so it is re-read
+_YAML_CACHE: Dict[tuple, Dict[str, Any]] = {}
+
+
+def _load_mapping(mapping_yaml: str | Path) -> Dict[str, Any]:
+    path = Path(mapping_yaml).resolve()
+    key = (str(path), path.stat().st_mtime_ns)
+    if key not in _YAML_CACHE:
+        with path.open("rb") as fh:
+            _YAML_CACHE[key] = yaml.load(fh, Loader=_YamlLoader)
+    return _YAML_CACHE[key]
+
+
 class Harmonizer:
     def __init__(self, mapping_yaml: str | Path):
-        self.mapping = yaml.safe_load(Path(mapping_yaml).read_text())
+        self.mapping = _load_mapping(mapping_yaml)
         self._prep_table_index()
 
     # ---------------- internal helpers ----------------
@@ -551,10 +751,32 @@ class Harmonizer:
             table = spec["target_table"]
             tcols = spec["target_columns"] if "target_columns" in spec else [spec["target_column"]]
             transforms = [self._get_tf(name) for name in spec.get("transforms", [])]
-            pattern = re.compile(spec["regex"]) if "regex" in spec else None
+            pattern = _compile_rule(spec["regex"]) if "regex" in spec else None
             self._table_rules.setdefault(table, []).append(
                 {"regex": pattern, "transforms": transforms, "targets": tcols}
             )
+        self._table_filter = {
+            table: self._fuse(rules) for table, rules in self._table_rules.items()
+        }
+
+    @staticmethod
+    def _fuse(rules: List[Dict[str, Any]]):
+        """
+        One alternation of all of a table's rule regexes, used as a prefilter:
+        a value it does not fullmatch matches no rule, so the per-rule loop is
+        skipped.  Several rules may match one value, so it never replaces that
+        loop.  None when a rule has no regex (it matches everything) or when
+        the patterns cannot be combined safely (back-references, flags, …).
+        """
+        if not rules or any(r["regex"] is None for r in rules):
+            return None
+        patterns = [r["regex"].pattern for r in rules]
+        if any(_BACKREF_RE.search(p) for p in patterns):
+            return None  # group numbers shift inside the alternation
+        try:
+            return _compile_rule("|".join(f"(?:{p})" for p in patterns))
+        except re.error:
+            return None
 
     @staticmethod
     def _get_tf(name: str) -> Callable:
@@ -563,6 +785,45 @@ class Harmonizer:
         except KeyError as err:
             raise KeyError(f"Unknown transform '{name}'") from err
 
+    @staticmethod
+    def _fetch_inputs(rules: List[Dict[str, Any]], rows: List[Dict], fetchers) -> Dict[Callable, set]:
+        """{fetcher: distinct arguments it will be called with} over *rows*."""
+        wanted: Dict[Callable, set] = {}
+        for row in rows:
+            for val in row.values():
+                if not isinstance(val, str):
+                    continue
+                for rule in rules:
+                    if rule["regex"] and not rule["regex"].fullmatch(val):
+                        continue
+                    # transforms before the fetch may rewrite the value
+                    payload = val
+                    for tf in rule["transforms"]:
+                        if tf in fetchers:
+                            if isinstance(payload, (str, int)):
+                                wanted.setdefault(tf, set()).add(payload)
+                            break
+                        payload = tf(payload)
+        return wanted
+
+    @classmethod
+    def _prefetch(cls, rules: List[Dict[str, Any]], rows: List[Dict]) -> Dict[tuple, Any]:
+        """
+        Resolve every remote lookup the batch will need up front: genes with
+        MyGene.info bulk POSTs, the other fetchers concurrently on the HTTP
+        pool.  Returns {(fetcher, argument): result} for the pooled calls; the
+        row loop reads it instead of calling the fetcher again, so a lookup
+        that failed (or fell back to a stub) runs once per batch, not twice.
+        """
+        wanted = cls._fetch_inputs(rules, rows, _REMOTE_FETCHERS | {fetch_gene_metadata})
+        genes = wanted.pop(fetch_gene_metadata, None)
+        if genes:
+            prefetch_gene_metadata(g for g in genes if isinstance(g, str))
+        calls = [(fn, arg) for fn, args in wanted.items() for arg in args]
+        if not calls:
+            return {}
+        return dict(zip(calls, _http_pool().map(lambda call: call[0](call[1]), calls)))
+
     # ---------------- public API ----------------
     def apply(self, table: str, rows: Iterable[Dict]) -> List[Dict]:
         """
@@ -575,25 +836,53 @@ class Harmonizer:
             return list(rows)
 
         rules = self._table_rules[table]
+        prefilter = self._table_filter[table]
         harmonised: List[Dict] = []
+        # checked once per call instead of per value × transform
+        debug = logger.isEnabledFor(logging.DEBUG)
+        # value → rules whose regex it matches; cell values repeat heavily
+        # across rows, so each distinct string is matched against the rules once
+        matching: Dict[str, tuple] = {}
+
+        remote_rules = [
+            r for r in rules
+            if any(tf is fetch_gene_metadata or tf in _REMOTE_FETCHERS for tf in r["transforms"])
+        ]
+        # (fetcher, argument) → result, resolved for the whole batch
+        fetched: Dict[tuple, Any] = {}
+        if remote_rules:
+            rows = list(rows)
+            fetched = self._prefetch(remote_rules, rows)
 
         for i, row in enumerate(rows):
             # logger.debug(f"ROW {i}: starting harmonization for row id={row.get('sample_id', '<no id>')}")
-            new_row = dict(row)  # shallow copy
+            new_row = row.copy()  # shallow copy
 
             # Run every rule on every original value in the input row
-            for val in list(row.values()):
+            # (updates go to new_row, so row itself can be iterated directly)
+            for val in row.values():
                 # logger.debug(f"ROW {i}:   examining value={val!r}")
                 if not isinstance(val, str):
                     continue
-                for rule in rules:
-                    if rule["regex"] and not rule["regex"].fullmatch(val):
-                        continue
+                hits = matching.get(val)
+                if hits is None:
+                    if prefilter is not None and not prefilter.fullmatch(val):
+                        hits = matching[val] = ()
+                    else:
+                        hits = matching[val] = tuple(
+                            r for r in rules if not r["regex"] or r["regex"].fullmatch(val)
+                        )
+                for rule in hits:
                     payload = val
                     # Sequentially apply transforms
                     for tf in rule["transforms"]:
-                        logger.debug(f'ROW {i}: applying transform "{[k for k, v in _TRANSFORM_REGISTRY.items() if v == tf]}" of harmonization on row: {payload}')
-                        payload = tf(payload)
+                        if debug:
+                            logger.debug('ROW %d: applying transform "%s" of harmonization on row: %s', i, tf.__name__, payload)
+                        if (tf in _REMOTE_FETCHERS and isinstance(payload, (str, int))
+                                and (tf, payload) in fetched):
+                            payload = fetched[(tf, payload)]
+                        else:
+                            payload = tf(payload)
                     # payload may be a dict (metadata expansion) or scalar
                     if isinstance(payload, dict):
                         new_row.update(payload)
@@ -607,6 +896,7 @@ class Harmonizer:
                             )
 
             harmonised.append(new_row)
-            logger.debug(f"ROW {i}: finished harmonization → {new_row}")
+            if debug:
+                logger.debug("ROW %d: finished harmonization → %s", i, new_row)
 
         return harmonised
@@ -31,13 +31,11 @@ from __future__ import annotations
 
 import argparse
 from concurrent.futures import ThreadPoolExecutor
-from errno import errorcode
 import json
 import logging
 import os
 import queue
 import re
-from sqlite3 import IntegrityError
 import threading
 from collections import defaultdict
 from contextlib import contextmanager
@@ -47,7 +45,7 @@ from typing import Dict, Iterable, List, Sequence, Tuple
 
 import concurrent
 import mysql.connector
-from mysql.connector import pooling
+from mysql.connector import IntegrityError, errorcode, pooling
 
 CONNECTION_TIMEOUT=10 # TODO: get this value from public config file
 LOGGER = logging.getLogger(__name__)
@@ -56,6 +54,7 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(threadName)s %(name)s: %(message)s",
 )
 _samples_lock = threading.Lock()
+_DUP_ENTRY_RE = re.compile(r"Duplicate entry '(.+)' for key '(.+)'")
 # ---------------------------------------------------------------------------
 # Helper – resolve ENV/CLI credentials
 # ---------------------------------------------------------------------------
@@ -155,15 +154,15 @@ class MySQLLoader:
         # Chop huge payloads to respect _MAX_BATCH
         for i in range(0, len(rows), self.batch_size):
             batch = rows[i : i + self.batch_size]
-            LOGGER.debug(f" enqueue: putting batch of {len(batch)} rows → {table}\n\t{batch}")
+            LOGGER.debug(" enqueue: putting batch of %d rows → %s\n\t%s", len(batch), table, batch)
             self._q.put((table, batch))
 
     def flush(self) -> Dict[str, int]:
         """Block until the queue empties, then return insert statistics."""
         LOGGER.debug(" flush: waiting for all enqueued batches to finish…")
-        LOGGER.debug(f">>> flush: unfinished tasks -> {self._q.unfinished_tasks}")
+        LOGGER.debug(">>> flush: unfinished tasks -> %d", self._q.unfinished_tasks)
         self._q.join()  # wait for tasks
-        LOGGER.debug(f" flush: done. insert statistics: {dict(self._stats)}")
+        LOGGER.debug(" flush: done. insert statistics: %s", dict(self._stats))
         return dict(self._stats)
 
     # ------------------------------------------------------------------
@@ -173,7 +172,7 @@ class MySQLLoader:
         while True:
             LOGGER.debug("Queue size before get(): %d", self._q.qsize())
             table, rows = self._q.get()
-            LOGGER.debug(f" worker: [{threading.current_thread().name}] picked up {len(rows)} rows → {table}")
+            LOGGER.debug(" worker: [%s] picked up %d rows → %s", threading.current_thread().name, len(rows), table)
             try:
                 # run the batch insert with a hard timeout
                 with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
@@ -181,7 +180,7 @@ class MySQLLoader:
                     inserted = fut.result(timeout=30)   # bail out after 30s
                 self._stats[table] += inserted
 
-                LOGGER.debug(f" worker: [{threading.current_thread().name}] inserted {inserted} rows into {table}")
+                LOGGER.debug(" worker: [%s] inserted %d rows into %s", threading.current_thread().name, inserted, table)
             except TimeoutError:
                 LOGGER.error("⏱  Insert batch timed out: %s rows → %s", len(rows), table)
             except Exception as exc:
@@ -196,7 +195,7 @@ class MySQLLoader:
 
     def _insert_batch(self, table: str, rows: List[Dict]) -> int:
         """Insert a batch; returns affected row-count (committed)."""
-        LOGGER.debug(f" _insert_batch: [{threading.current_thread().name}] _insert_batch START → {len(rows)} rows into {table}")
+        LOGGER.debug(" _insert_batch: [%s] _insert_batch START → %d rows into %s", threading.current_thread().name, len(rows), table)
         start = time.time()
 
         cols = self._table_columns(table)
@@ -222,35 +221,19 @@ class MySQLLoader:
                 try:
                     with self._tx(conn):
                         cur = conn.cursor()
-                        # Insert per-row to catch duplicates
-                        inserted_this_tx = 0
-                        for vals in values:
-                            try:
-                                cur.execute(sql, vals)
-                                # count only actual inserts
-                                if cur.rowcount:
-                                    inserted_this_tx += 1
-                            except IntegrityError as e:
-                                # existing duplicate logic
-                                if e.errno == errorcode.ER_DUP_ENTRY:
-                                    m = re.search(r"Duplicate entry '(.+)' for key '(.+)'", e.msg)
-                                    if m:
-                                        dup_val, dup_key = m.groups()
-                                        LOGGER.warning(
-                                            "[%s] duplicate key %r=%r on row %s — skipping",
-                                            table, dup_key, dup_val, vals
-                                        )
-                                    else:
-                                        LOGGER.warning(
-                                            "[%s] duplicate entry error on row %s: %s — skipping",
-                                            table, vals, e.msg
-                                        )
-                                    continue
-                                else:
-                                    raise
+                        try:
+                            # one multi-row INSERT per batch; INSERT IGNORE
+                            # already skips duplicates, rowcount = rows added
+                            cur.executemany(sql, values)
+                            inserted_this_tx = max(cur.rowcount, 0)
+                        except mysql.connector.IntegrityError as e:
+                            LOGGER.warning(
+                                "[%s] batch insert failed (%s) — retrying row by row", table, e
+                            )
+                            inserted_this_tx = self._insert_rows(cur, sql, values, table)
                         affected = inserted_this_tx
                     LOGGER.debug(" %s ← %d rows (cols=%d)", table, affected, len(keys))
-                    LOGGER.debug(f" _insert_batch: [{threading.current_thread().name}] _insert_batch COMMIT for {table} ({len(rows)} rows) in {time.time()-start:.2f}s")
+                    LOGGER.debug(" _insert_batch: [%s] _insert_batch COMMIT for %s (%d rows) in %.2fs", threading.current_thread().name, table, len(rows), time.time() - start)
                     # only break if we inserted at least one row or this was last attempt
                     # for Studies we don’t expect 100% new rows every batch,
                     # so treat zero-rows as success and stop retrying
@@ -296,6 +279,37 @@ class MySQLLoader:
         # # ── END STUB ───────────────────────────────────────────────
 
 
+    @staticmethod
+    def _insert_rows(cur, sql: str, values: List[tuple], table: str) -> int:
+        """Row-at-a-time fallback for a batch whose multi-row INSERT failed."""
+        # Insert per-row to catch duplicates
+        inserted_this_tx = 0
+        for vals in values:
+            try:
+                cur.execute(sql, vals)
+                # count only actual inserts
+                if cur.rowcount:
+                    inserted_this_tx += 1
+            except IntegrityError as e:
+                # existing duplicate logic
+                if e.errno == errorcode.ER_DUP_ENTRY:
+                    m = _DUP_ENTRY_RE.search(e.msg)
+                    if m:
+                        dup_val, dup_key = m.groups()
+                        LOGGER.warning(
+                            "[%s] duplicate key %r=%r on row %s — skipping",
+                            table, dup_key, dup_val, vals
+                        )
+                    else:
+                        LOGGER.warning(
+                            "[%s] duplicate entry error on row %s: %s — skipping",
+                            table, vals, e.msg
+                        )
+                    continue
+                else:
+                    raise
+        return inserted_this_tx
+
     # ------------------------------------------------------------------
     # Caching
     # ------------------------------------------------------------------
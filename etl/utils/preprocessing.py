@@ -13,6 +13,7 @@ from __future__ import annotations
 
 import re
 from datetime import datetime
+from functools import lru_cache
 from typing import Dict, Any
 
 _CURIE_BASE = {
@@ -23,14 +24,22 @@ _CURIE_BASE = {
     "UBERON":"http://purl.obolibrary.org/obo/UBERON_",
 }
 
+_SAMPLE_ID_RE = re.compile(r"SAMP[A-Z0-9]{8}")
+
+# the same accessions / CURIEs recur across rows and batches; these helpers
+# are pure, so each distinct input is computed once
+_MEMO_SIZE = 32768
+
 # ───────────────────────────────────────────────────────────────────────────
 #  Simple transforms
 # ───────────────────────────────────────────────────────────────────────────
+@lru_cache(maxsize=_MEMO_SIZE)
 def strip_version(ensembl_id: str) -> str:
     """Drop the ''.13'' suffix from an Ensembl accession."""
     return ensembl_id.split(".", 1)[0]
 
 
+@lru_cache(maxsize=_MEMO_SIZE)
 def canonical_iri(curie_or_iri: str) -> str:
     """
     Return a full IRI for common CURIEs (CHEBI:…, EFO:…, NCBITaxon:…, CL_, UBERON_).
@@ -39,16 +48,18 @@ def canonical_iri(curie_or_iri: str) -> str:
     if curie_or_iri.startswith(("http://", "https://")):
         return curie_or_iri
 
-    for prefix, base in _CURIE_BASE.items():
-        if curie_or_iri.startswith(f"{prefix}:"):
-            return base + curie_or_iri.split(":", 1)[1]
-        if curie_or_iri.startswith(f"{prefix}_"):
-            return base + curie_or_iri.split("_", 1)[1]
+    # "CHEBI:123" or "CHEBI_123": one partition + dict lookup per separator
+    for sep in (":", "_"):
+        prefix, found, local = curie_or_iri.partition(sep)
+        base = _CURIE_BASE.get(prefix) if found else None
+        if base:
+            return base + local
 
     # unknown pattern – return untouched
     return curie_or_iri
 
 
+@lru_cache(maxsize=_MEMO_SIZE)
 def normalize_study_accession(acc: str) -> str:
     """Upper-case and strip spaces from study IDs such as e-mtab-1234."""
     return acc.strip().upper()
@@ -59,7 +70,7 @@ def extract_sample_id(sample_id: str) -> str:
     Validate & return the sample ID.
     Raises ValueError if the string does not match the expected pattern.
     """
-    if not re.fullmatch(r"SAMP[A-Z0-9]{8}", sample_id):
+    if not _SAMPLE_ID_RE.fullmatch(sample_id):
         raise ValueError(f"malformed sample_id: '{sample_id}'")
     return sample_id
 
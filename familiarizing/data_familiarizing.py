@@ -4,6 +4,9 @@
 # import anndata
 # import scanpy
 # import anndata
+import atexit
+
+import numpy as np
 import zarr
 
 print("Up and running...")
@@ -29,20 +32,36 @@ print("Now exploring the Zarr file structure...")
 # adata = ad.read_zarr("parkinson_organoid_data.zarr")
 # Open the Zarr file
 # root = zarr.open("parkinson_organoid_data.zarr", mode="r")
-root = zarr.open("raw_data/CELLxGENE/dementia/astrocyte_DLPFC.zarr", mode="r")
+try:
+    # stores written by convert_to_zarr.py carry consolidated metadata
+    root = zarr.open_consolidated("raw_data/CELLxGENE/dementia/astrocyte_DLPFC.zarr", mode="r")
+except KeyError:
+    root = zarr.open("raw_data/CELLxGENE/dementia/astrocyte_DLPFC.zarr", mode="r")
+
+LOGFILE = "./data_familiarizing_astrocyte_DLPFC.log"
+_LOG_FHS = {}
+
+
+def _log_handle(logfile):
+    """Open each log file once (64 KiB buffer) and close it at interpreter exit."""
+    fh = _LOG_FHS.get(logfile)
+    if fh is None:
+        fh = _LOG_FHS[logfile] = open(logfile, "a", buffering=1 << 16)
+        atexit.register(fh.close)
+    return fh
+
 
-def print_and_log(message, logfile="./data_familiarizing_astrocyte_DLPFC.log"):
+def print_and_log(message, logfile=LOGFILE):
     """It prints a message to the console and logs it to a file.
 
     Args:
         message (string): the message to print and log.
-        logfile (string, optional): the full path to the log file . Defaults to None.
+        logfile (string, optional): the full path to the log file . Defaults to LOGFILE.
     """
     if not isinstance(message, str):
         message = str(message)
     print(message)
-    with open(logfile, "a") as log_file:
-        log_file.writelines(line + "\n" for line in message.splitlines())
+    _log_handle(logfile).write(message + "\n")
 
 
 # Print tree structure
@@ -63,14 +82,24 @@ def print_categories(zgroup, path_prefix=""):
         try:
             subgroup = zgroup[key]
             if isinstance(subgroup, zarr.hierarchy.Group) and "categories" in subgroup and "codes" in subgroup:
-                codes = set(subgroup["codes"])
-                categories = subgroup["categories"]
-                values = set(categories[i] for i in codes)
-                if len(codes) < 30 and len(categories) < 30 and len(values) > 0:
-                    print_and_log(f"\n{path_prefix}{key}: {sorted(values)}")
+                # one decompression + one sort per array instead of a Python
+                # set over every code and a zarr read per category
+                codes_np = np.asarray(subgroup["codes"][:])
+                uniq = np.unique(codes_np)
+                cats_np = np.asarray(subgroup["categories"][:])
+                # -1 marks a missing value in anndata categoricals; it must
+                # not wrap around to the last category
+                present = uniq[(uniq >= 0) & (uniq < cats_np.size)]
+                values = cats_np[present]
+                if values.dtype.kind == "S":
+                    values = np.char.decode(values, "utf-8")
+                values = np.unique(values).tolist()
+                # both sides count distinct categories now
+                if present.size < 30 and len(values) > 0:
+                    print_and_log(f"\n{path_prefix}{key}: {values}")
                 else:
                     print_and_log(f"\n{path_prefix}{key}: too many unique values ({len(values)}) to display")
-                    print_and_log(f"\nPrinting the first 10 unique values for {path_prefix}{key}: {sorted(values)[:10]}")
+                    print_and_log(f"\nPrinting the first 10 unique values for {path_prefix}{key}: {values[:10]}")
             elif isinstance(subgroup, zarr.hierarchy.Group):
                 # Recursively check subgroups
                 print_categories(subgroup, path_prefix + key + ".")
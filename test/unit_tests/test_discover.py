@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+
+def test_discover_files_single_pass(tmp_path):
+    from etl.discover import discover_files
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "x.tsv").write_text("h\n")
+    (tmp_path / "b.txt").write_text("")
+    store = tmp_path / "a" / "s.zarr"
+    (store / "X").mkdir(parents=True)
+    (store / "X" / "0.0").write_text("")
+
+    found = {p.relative_to(tmp_path).as_posix() for p in discover_files(tmp_path)}
+    assert found == {"a/x.tsv", "a/s.zarr"}
+
+
+def test_discover_files_missing_dir(tmp_path):
+    from etl.discover import discover_files
+    assert list(discover_files(tmp_path / "nope")) == []
+
+
+def test_scandir_files_skips_directories_named_like_files(tmp_path):
+    from etl.discover import scandir_files
+    (tmp_path / "foo.tsv").mkdir()
+    (tmp_path / "foo.tsv" / "y.tsv").write_text("h\n")
+    (tmp_path / "x.tsv").write_text("h\n")
+
+    found = {e.name for e in scandir_files(tmp_path, (".tsv",))}
+    assert found == {"x.tsv", "y.tsv"}
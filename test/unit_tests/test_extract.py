@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+import pytest
+
+
+def test_table_for_keeps_list_priority():
+    from etl.extract import _table_for
+    assert _table_for("gene_catalog.tsv") == "Genes"
+    assert _table_for("experiment_sample_microbe.tsv") == "SampleMicrobe"
+    assert _table_for("experiment_01_raw_counts.tsv") == "Samples"
+    assert _table_for("notes.tsv") is None
+
+
+def test_arrow_reader_matches_dictreader_on_ragged_rows(tmp_path):
+    pytest.importorskip("pyarrow")
+    from etl.extract import Extractor
+    tsv = tmp_path / "gene_catalog.tsv"
+    tsv.write_text("a\tb\tc\n1\t2\t3\n4\t5\t6\t7\n8\t9\n10\t11\t12\n")
+
+    ex = Extractor(tmp_path, batch_size=2)
+    arrow_rows = [r for b in ex._read_file_arrow(tsv, None) for r in b]
+    csv_rows = [r for b in ex._read_file_csv(tsv, None) for r in b]
+    assert arrow_rows == csv_rows
+    assert csv_rows[1] == {"a": "4", "b": "5", "c": "6", None: ["7"]}
+    assert csv_rows[2] == {"a": "8", "b": "9", "c": None}
@@ -3,3 +3,31 @@
 def test_strip_version():
     from etl.utils.preprocessing import strip_version
     assert strip_version("ENSG00000139618.15") == "ENSG00000139618"
+
+
+def test_json_cache_is_bounded(monkeypatch):
+    import etl.harmonize as h
+    monkeypatch.setattr(h, "JSON_CACHE_SIZE", 2)
+    monkeypatch.setattr(h, "_JSON_CACHE", h.OrderedDict())
+    for url in ("a", "b", "c"):
+        h._json_cache_put(url, {"url": url})
+    assert h._json_cache_get("a") is None
+    assert h._json_cache_get("b") == {"url": "b"}
+    h._json_cache_put("d", {"url": "d"})  # "c" is now the oldest
+    assert list(h._JSON_CACHE) == ["b", "d"]
+
+
+def test_apply_reuses_prefetched_results(monkeypatch):
+    import etl.harmonize as h
+    calls = []
+    monkeypatch.setattr(h, "_geo_json", lambda acc: calls.append(acc))  # GEO down
+
+    harmonizer = h.Harmonizer.__new__(h.Harmonizer)
+    harmonizer._table_rules = {"Studies": [
+        {"regex": None, "transforms": [h.fetch_study_metadata], "targets": ["study"]},
+    ]}
+    harmonizer._table_filter = {"Studies": None}
+    out = harmonizer.apply("Studies", [{"study_id": "GSE1"}, {"study_id": "GSE1"}])
+
+    assert len(calls) == 1
+    assert out[0] == out[1]
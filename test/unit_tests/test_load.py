@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import pytest
+
+
+class _DupCursor:
+    """Cursor stub whose execute() rejects one value as a duplicate key."""
+
+    def __init__(self, dup_value, exc_type, errno):
+        self.dup_value = dup_value
+        self.exc_type = exc_type
+        self.errno = errno
+        self.rowcount = 0
+        self.executed = []
+
+    def execute(self, sql, vals):
+        if vals[0] == self.dup_value:
+            self.rowcount = 0
+            raise self.exc_type(
+                msg=f"Duplicate entry '{vals[0]}' for key 'PRIMARY'", errno=self.errno
+            )
+        self.executed.append(vals)
+        self.rowcount = 1
+
+
+def test_insert_rows_skips_duplicate_entries():
+    connector = pytest.importorskip("mysql.connector")
+    from mysql.connector import errorcode
+    from etl.load import MySQLLoader
+
+    cur = _DupCursor("g2", connector.IntegrityError, errorcode.ER_DUP_ENTRY)
+    values = [("g1",), ("g2",), ("g3",)]
+    inserted = MySQLLoader._insert_rows(cur, "INSERT INTO Genes VALUES (%s)", values, "Genes")
+    assert inserted == 2
+    assert cur.executed == [("g1",), ("g3",)]
+
+
+def test_insert_rows_reraises_other_integrity_errors():
+    connector = pytest.importorskip("mysql.connector")
+    from mysql.connector import errorcode
+    from etl.load import MySQLLoader
+
+    cur = _DupCursor("g2", connector.IntegrityError, errorcode.ER_NO_REFERENCED_ROW_2)
+    with pytest.raises(connector.IntegrityError):
+        MySQLLoader._insert_rows(cur, "INSERT INTO Genes VALUES (%s)", [("g2",)], "Genes")
@@ -1,19 +1,28 @@
 #!/usr/bin/env python3
 
+import os
 from pathlib import Path
 
 def discover(landing_dir="raw_data"):
-    for path in Path(landing_dir).rglob("*"):
-        if path.suffix in {".zarr", ".tsv", ".txt"}:
-            yield path
-        elif path.is_dir() and not path.name.startswith("."):
-            # Recursively yield files in subdirectories
-            yield from discover(path)
-        elif path.is_file() and not path.name.startswith("."):
-            # Yield individual files that are not hidden
-            yield path
-        else:
-            # Skip hidden files and directories
+    # single os.scandir walk: every entry is visited once, and .zarr stores
+    # are yielded whole instead of listing their chunk files
+    stack = [str(landing_dir)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
             continue
-            pass
-    return
\ No newline at end of file
+        for entry in entries:
+            if entry.name.startswith("."):
+                # Skip hidden files and directories
+                continue
+            path = Path(entry.path)
+            if path.suffix in {".zarr", ".tsv", ".txt"}:
+                yield path
+            elif entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file():
+                # Yield individual files that are not hidden
+                yield path
@@ -4,97 +4,421 @@
 Now reads a YAML mapping and only yields the mapped columns,
 and can include raw count URIs based on `mode`.
 API changed: extract(Path, mapping, mode) -> iterable of {column, value}.
+With legacy=False it yields ColumnBatch(column, values) instead (values is a
+pyarrow.Array, or an ndarray without pyarrow), one per zarr chunk / TSV
+column slab, which harmonize() accepts as well; _explode() turns a batch
+back into {column, value} dicts.
 """
 from __future__ import annotations
+import csv
+import itertools
+import logging
+import os
 import re
-from pathlib import Path
-from typing import Any, Dict, Generator, Iterable, Set
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, FrozenSet, Generator, Iterable, Set, Tuple, Union
+from urllib.parse import urlsplit
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class ColumnBatch:
+    """One slab of a single source column (a zarr chunk or a TSV slab)."""
+    # spelled out rather than slots=True, which needs Python 3.10
+    __slots__ = ("column", "values")
+
+    column: str
+    values: Any  # pyarrow.Array, or numpy.ndarray without pyarrow
+
+    def to_list(self) -> list:
+        """Plain Python values, converted in one C call."""
+        if hasattr(self.values, "to_pylist"):
+            return self.values.to_pylist()
+        return self.values.tolist()
+
+    def distinct(self) -> list:
+        """Distinct values in first-seen order, deduplicated by a hash kernel."""
+        if hasattr(self.values, "to_pylist"):
+            return self.values.unique().to_pylist()
+        try:
+            import pandas as pd
+        except ImportError:                           # pragma: no cover
+            return list(dict.fromkeys(self.values.tolist()))
+        return pd.unique(self.values).tolist()
 
-from etl.utils.misc import create_timestamped_filename, print_and_log
 
 def _yield_dicts(column: str, values: Iterable[Any]) -> Generator[Dict[str, Any], None, None]:
     """Yield the minimal dict shape expected by harmonizer."""
+    if hasattr(values, "to_pylist"):
+        values = values.to_pylist()
+    elif hasattr(values, "tolist"):
+        # one C loop to Python objects instead of boxing a NumPy scalar per row
+        values = values.tolist()
     for v in values:
         yield {"column": column, "value": v}
 
 
-def extract(path: Path,
-            mapping: dict,
+@lru_cache(maxsize=None)
+def _pyarrow():
+    """
+    Columnar batches are handed out as Arrow arrays when pyarrow is available,
+    otherwise as NumPy arrays; harmonize() accepts either.  Imported on first
+    use, like zarr/pandas/yaml, so `import etl.extract` stays cheap.
+    """
+    try:
+        import pyarrow
+    except ImportError:                               # pragma: no cover
+        return None
+    return pyarrow
+
+
+def _yield_batches(column: str, values: Iterable[Any]) -> Generator[ColumnBatch, None, None]:
+    """Yield a whole column slice as one ColumnBatch (no per-value dicts)."""
+    arr = np.asarray(values)
+    pa = _pyarrow()
+    if pa is not None:
+        try:
+            yield ColumnBatch(column, pa.array(arr))
+            return
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass  # mixed-type object columns stay NumPy
+    yield ColumnBatch(column, arr)
+
+
+def _explode(batch: ColumnBatch) -> Generator[Dict[str, Any], None, None]:
+    """Compatibility adapter: ColumnBatch → legacy {column, value} dicts."""
+    yield from _yield_dicts(batch.column, batch.values)
+
+
+def _emit(column: str, values, legacy: bool) -> Generator[Dict[str, Any] | ColumnBatch, None, None]:
+    if legacy:
+        # explode to one dict per value only for callers that still need it
+        yield from _yield_dicts(column, values)
+    else:
+        yield from _yield_batches(column, values)
+
+
+def _iter_blocks(array, reuse: bool = False) -> Generator[Any, None, None]:
+    """
+    Read a 1-D zarr array one storage chunk at a time, so only a single
+    compressed chunk is decompressed and held in memory per step.
+    With reuse=True every block is decoded into the same preallocated buffer
+    and a view of it is yielded: the caller must be done with a block before
+    asking for the next one.
+    """
+    step = array.chunks[0] or len(array)
+    total = array.shape[0]
+    if not reuse or array.dtype == object:
+        # object (string) arrays are decoded to new objects anyway
+        for start in range(0, total, step):
+            yield array[start:start + step]
+        return
+    buf = np.empty(min(step, total), dtype=array.dtype)
+    for start in range(0, total, step):
+        n = min(step, total - start)
+        array.get_basic_selection(slice(start, start + n), out=buf[:n])
+        yield buf[:n]
+
+
+def _prefetch_slabs(array, pool: ThreadPoolExecutor, depth: int = 4) -> Generator[Any, None, None]:
+    """
+    Like _iter_blocks, but keeps up to *depth* chunk reads in flight on
+    *pool* so fetch/decompression overlaps with the consumer.  Blocks come
+    back in order, each in a fresh array.
+    """
+    step = array.chunks[0] or len(array)
+    starts = iter(range(0, array.shape[0], step))
+    pending: deque = deque()
+    for start in itertools.islice(starts, depth):
+        pending.append(pool.submit(array.__getitem__, slice(start, start + step)))
+    while pending:
+        block = pending.popleft().result()
+        nxt = next(starts, None)
+        if nxt is not None:
+            pending.append(pool.submit(array.__getitem__, slice(nxt, nxt + step)))
+        yield block
+
+
+def _yield_zarr_column(column: str, array, legacy: bool = True,
+                       pool: ThreadPoolExecutor | None = None,
+                       depth: int = 4) -> Generator[Dict[str, Any], None, None]:
+    if pool is not None:
+        blocks = _prefetch_slabs(array, pool, depth)
+    else:
+        # legacy mode copies each block out with .tolist() before the next
+        # read, so the decode buffer can be shared; columnar batches may be
+        # zero-copy views held by the consumer, so they get fresh arrays
+        blocks = _iter_blocks(array, reuse=legacy)
+    for block in blocks:
+        if block.dtype.kind == "S":
+            # fixed-width byte strings: decode the whole slab in one C loop
+            block = np.char.decode(block, "utf-8")
+        yield from _emit(column, block, legacy)
+
+
+MappingColumns = Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str]]
+
+
+def _split_mapping_columns(keys: Iterable[str]) -> MappingColumns:
+    """
+    Split mapping['columns'] keys into (obs names, var names, other full keys).
+    "obs.x" / "var.x" address zarr arrays; anything else is matched against
+    "<tsv stem>.<column>" as is.  A trailing "(...)" annotation is ignored.
+    """
+    obs, var, tsv = set(), set(), set()
+    targets = {"obs": obs, "var": var}
+    for raw in keys:
+        key = raw.split("(")[0].strip()
+        prefix, _, name = key.partition(".")
+        target = targets.get(prefix)
+        if target is not None:
+            target.add(name)
+        else:
+            tsv.add(key)
+    return frozenset(obs), frozenset(var), frozenset(tsv)
+
+
+@lru_cache(maxsize=8)
+def _read_mapping(path_str: str, mtime_ns: int) -> dict:
+    # mtime is part of the key so an edited mapping is picked up again
+    import yaml
+    with open(path_str, "r") as fh:
+        return yaml.safe_load(fh)
+
+
+def _mapping_key(path: Union[str, Path]) -> Tuple[str, int]:
+    path_str = str(Path(path).resolve())
+    return path_str, os.stat(path_str).st_mtime_ns
+
+
+def _load_mapping_cached(path: Union[str, Path]) -> dict:
+    """
+    Parsed YAML mapping for *path*, read once per (file, mtime).  The dict is
+    shared between callers and must not be mutated.
+    """
+    return _read_mapping(*_mapping_key(path))
+
+
+@lru_cache(maxsize=8)
+def _parse_mapping_file(path_str: str, mtime_ns: int) -> MappingColumns:
+    return _split_mapping_columns(_read_mapping(path_str, mtime_ns)["columns"])
+
+
+# id(mapping dict) → (dict, parsed columns); the dict is kept alongside so a
+# recycled id of a collected dict can never hit
+_PARSE_CACHE: Dict[int, Tuple[dict, MappingColumns]] = {}
+_PARSE_CACHE_MAX = 32
+
+
+def _parse_mapping_columns(mapping: Union[dict, str, Path]) -> MappingColumns:
+    """
+    Return (obs_allowed, var_allowed, tsv_allowed) for a mapping dict or YAML path.
+    Results are memoised per file (path + mtime) or per dict object, so a
+    mapping dict must not be edited in place between extract() calls.
+    """
+    if isinstance(mapping, (str, Path)):
+        return _parse_mapping_file(*_mapping_key(mapping))
+    hit = _PARSE_CACHE.get(id(mapping))
+    if hit is not None and hit[0] is mapping:
+        return hit[1]
+    parsed = _split_mapping_columns(mapping["columns"])
+    if len(_PARSE_CACHE) >= _PARSE_CACHE_MAX:
+        _PARSE_CACHE.clear()
+    _PARSE_CACHE[id(mapping)] = (mapping, parsed)
+    return parsed
+
+
+def _count_header_comments(path: Path) -> int:
+    """Number of leading '#' lines (the SDRF/IDF comment block) in *path*."""
+    n = 0
+    with open(path, "rb") as fh:
+        while fh.readline().startswith(b"#"):
+            n += 1
+    return n
+
+
+def _resolve_tsv_cols(path: Path, tsv_allowed: FrozenSet[str], skip: Set[str],
+                      n_comments: int = 0) -> list:
+    """
+    Peek the header (first line after the comment block) of *path* and return
+    the mapped columns, in file order, as a concrete `usecols` list for the C parser.
+    """
+    with path.open(newline="") as fh:
+        for _ in range(n_comments):
+            fh.readline()
+        header = next(csv.reader(fh, delimiter="\t"), [])
+    return [c for c in header if c not in skip and f"{path.stem}.{c}" in tsv_allowed]
+
+
+# rows per DataFrame slab when streaming TSVs
+CHUNK = 10_000
+
+
+def _read_tsv_chunks(path: Path, usecols: list, n_comments: int = 0):
+    """
+    Stream *path* as DataFrames of ≤ CHUNK rows, so peak memory is one slab
+    rather than the whole file.  The leading comment block is skipped by line
+    count, so the tokenizer does not test every line for a comment marker.
+    Falls back to the Python tokenizer if the C parser rejects the file
+    before anything was produced.
+    """
+    import pandas as pd
+
+    read_opts = dict(sep="\t", dtype=str, usecols=usecols, skiprows=n_comments,
+                     on_bad_lines="skip", chunksize=CHUNK)
+    produced = False
+    try:
+        # an open, 1 MiB-buffered handle skips pandas' path/URL sniffing
+        with open(path, "rb", buffering=1 << 20) as fh, \
+                pd.read_csv(fh, engine="c", **read_opts) as reader:
+            for chunk in reader:
+                produced = True
+                yield chunk
+    except pd.errors.ParserError:
+        if produced:
+            raise
+        # malformed quoting etc.: the Python tokenizer is more lenient
+        with open(path, "rb", buffering=1 << 20) as fh, \
+                pd.read_csv(fh, engine="python", **read_opts) as reader:
+            yield from reader
+
+
+@lru_cache(maxsize=8)
+def _open_zarr(path_str: str):
+    """
+    Open a store read-only once per ETL run; metadata parsing of big obs/var
+    groups dominates open time, so repeated extract() calls reuse the group.
+    URLs (s3://, gs://, https://) are opened through fsspec by zarr itself.
+    """
+    import zarr
+    if hasattr(zarr, "config"):  # zarr v3: fetch array metadata concurrently
+        zarr.config.set({"async.concurrency": 16})
+    try:
+        # one .zmetadata read instead of a metadata file per array
+        return zarr.open_consolidated(path_str, mode="r")
+    except KeyError:
+        return zarr.open(path_str, mode="r")
+
+
+# chunk reads kept in flight: local disks saturate quickly, object stores
+# (one HTTP GET per chunk) need many concurrent requests to hide latency
+LOCAL_DEPTH = 4
+REMOTE_DEPTH = 16
+
+
+def _is_remote(path: Union[str, Path]) -> bool:
+    return isinstance(path, str) and "://" in path
+
+
+def extract(path: Union[Path, str],
+            mapping: Union[dict, str, Path],
             skip_zarr_datasets: Set[str] = None,
             skip_tsv_columns: Set[str] = None,
-            mode: str = "metadata"  # one of 'metadata', 'counts', 'both'
+            mode: str = "metadata",  # one of 'metadata', 'counts', 'both'
+            legacy: bool = True,
+            io_threads: int | None = None,
            ) -> Generator[Dict[str, Any], None, None]:
     """
     Streams rows from .zarr or tab-separated files as {column, value},
-    but only for columns defined in mapping['columns'].
+    but only for columns defined in mapping['columns'] (a dict or the YAML path).
     If mode includes 'counts', yields a zarr_uri (raw_counts_uri) entry pointing to the file.
+    If legacy is False, yields ColumnBatch objects holding an Arrow/NumPy array instead.
+    Zarr chunks are read ahead on `io_threads` threads (default min(32, 2×CPUs));
+    pass 0 to read serially.
+    `path` may also be an fsspec URL ("s3://bucket/x.zarr") of a remote zarr
+    store; chunk reads are then prefetched deeper.
     """
     skip_zarr_datasets = skip_zarr_datasets or {"X", "counts"}
     skip_tsv_columns   = skip_tsv_columns   or set()
 
-    suffix = path.suffix.lower()
+    remote = _is_remote(path)
+    if remote:
+        # keep the URL intact (Path() would collapse "//"); only zarr is supported
+        name = PurePosixPath(urlsplit(path).path).name
+        suffix = PurePosixPath(name).suffix.lower()
+        if suffix != ".zarr":
+            LOGGER.warning("Remote %s is not a zarr store, skipping", path)
+            return
+    else:
+        path = Path(path)
+        name = path.name
+        suffix = path.suffix.lower()
+    depth = REMOTE_DEPTH if remote else LOCAL_DEPTH
+    obs_allowed, var_allowed, tsv_allowed = _parse_mapping_columns(mapping)
 
-    logfile = create_timestamped_filename("../extract_logs")
+    # nothing in this file can be mapped: don't even open it
+    if suffix == ".zarr" and mode == "metadata" and not (obs_allowed or var_allowed):
+        return
+    if suffix in {".tsv", ".txt"} and not tsv_allowed:
+        return
     
     # ───────────────────────────── ZARR ──────────────────────────────
     if suffix == ".zarr":
-        import zarr
-        root = zarr.open(path, mode="r")
+        root = _open_zarr(str(path))
 
         # metadata only or both
         if mode in ("metadata", "both"):
-            # ---- 1. Variable/feature table ----
-            var_group = root["var"]
-            for var_key in var_group.array_keys():
-                map_key = f"var.{var_key}"
-                print_and_log(f"\t\t{path}: {map_key}", add_timestamp=False, logfile_path=logfile, collapse_size=0)
-                if map_key not in mapping["columns"]:
-                    continue
-                col = var_group[var_key][:]
-                print_and_log(f"[extract] {path.name} var → {var_key}", logfile_path=logfile)
-                yield from _yield_dicts(var_key, col)
-
-            # ---- 2. Observation/sample metadata ----
-            obs_group = root["obs"]
-            for obs_key in obs_group.array_keys():
-                if obs_key in skip_zarr_datasets:
-                    continue
-                map_key = f"obs.{obs_key}"
-                if map_key not in mapping["columns"]:
-                    continue
-                col = obs_group[obs_key][:]
-                print_and_log(f"[extract] {path.name} obs → {obs_key}", logfile_path=logfile)
-                yield from _yield_dicts(obs_key, col)
+            if io_threads is None:
+                io_threads = min(32, (os.cpu_count() or 1) * 2)
+            with (ThreadPoolExecutor(max_workers=io_threads) if io_threads else nullcontext()) as pool:
+                # ---- 1. Variable/feature table ----
+                var_group = root["var"]
+                # .arrays() hands back opened arrays instead of one lookup per key
+                for var_key, var_array in var_group.arrays():
+                    LOGGER.debug("\t\t%s: var.%s", path, var_key)
+                    if var_key not in var_allowed:
+                        continue
+                    LOGGER.debug("[extract] %s var → %s", name, var_key)
+                    yield from _yield_zarr_column(var_key, var_array, legacy, pool, depth)
+
+                # ---- 2. Observation/sample metadata ----
+                obs_group = root["obs"]
+                for obs_key, obs_array in obs_group.arrays():
+                    if obs_key in skip_zarr_datasets:
+                        continue
+                    if obs_key not in obs_allowed:
+                        continue
+                    LOGGER.debug("[extract] %s obs → %s", name, obs_key)
+                    yield from _yield_zarr_column(obs_key, obs_array, legacy, pool, depth)
 
                 # counts only or both
         if mode in ("counts", "both"):
             # yield URI for each sample's raw counts
             obs_group = root["obs"]
-            if "sample_id" in obs_group.array_keys():
+            obs_keys = frozenset(obs_group.array_keys())
+            if "sample_id" in obs_keys:
                 sample_ids = obs_group["sample_id"][:]
-                for sid in sample_ids:
-                    uri = f"{path}#obs/{sid}"
-                    yield {"column": "zarr_uri", "value": uri} # TODO rename zarr_uri to raw_counts_uri
+                if sample_ids.dtype.kind == "S":
+                    sample_ids = np.char.decode(sample_ids, "utf-8")
+                # one vectorised concat instead of an f-string per sample
+                uris = np.char.add(f"{path}#obs/", sample_ids.astype(str))
+                yield from _emit("zarr_uri", uris, legacy) # TODO rename zarr_uri to raw_counts_uri
 
     # ───────────────────────────── TSV / TXT ────────────────────────────── / TXT ──────────────────────────────
     elif suffix in {".tsv", ".txt"}:
-        import pandas as pd
-
         # skip raw/counts files
         if any(k in path.name.lower() for k in ("raw", "count", "idf", "raw_counts")):
             return
 
         # metadata only or both
         if mode in ("metadata", "both"):
-            df = pd.read_csv(path, sep="\t", dtype=str, engine="python", on_bad_lines="skip")
-            for col in df.columns:
-                if col in skip_tsv_columns:
-                    continue
-                map_key = f"{path.stem}.{col}"
-                if map_key not in mapping["columns"]:
-                    continue
-                print_and_log(f"[extract] {path.name} tsv → {col}", logfile_path=logfile)
-                yield from _yield_dicts(col, df[col].values)
+            # only parse mapped columns; skip the file entirely when none are
+            n_comments = _count_header_comments(path)
+            wanted = _resolve_tsv_cols(path, tsv_allowed, skip_tsv_columns, n_comments)
+            if not wanted:
+                return
+            for chunk in _read_tsv_chunks(path, wanted, n_comments):
+                for col in chunk.columns:
+                    LOGGER.debug("[extract] %s tsv → %s", path.name, col)
+                    yield from _emit(col, chunk[col].to_numpy(copy=False), legacy)
         # raw count not supported
 
     # ───────────────────────────── Unsupported ──────────────────────────────
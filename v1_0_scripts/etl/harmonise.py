@@ -4,13 +4,31 @@ Harmonizer v2.2 – mapping.yml–driven, with fallback APIs for ontology and ta
 2025-06-23
 """
 
-import re
+import atexit
+import gzip
+import io
+import json
+import os
+import pickle
+import shelve
+import threading
+import time
 import yaml
 import requests
-import xmltodict
+from collections import defaultdict
+from xml.etree import ElementTree
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial, wraps
 from pathlib import Path
 from typing import Any, Dict, Optional
 
+try:                                    # optional: ~2-3x faster JSON decoding
+    from orjson import loads as _loads
+except ImportError:                     # pragma: no cover
+    _loads = json.loads
+
 # ─── Core ontology & taxonomy helpers ───────────────────────────────────────────
 
 PREFIX_TO_IRI = {
@@ -25,43 +43,392 @@ PREFIX_TO_IRI = {
     "HsapDv":    "http://purl.obolibrary.org/obo/HsapDv_",
 }
 
+# every base above ends in "/<PREFIX>_", so normalize_ontology_id() reads an
+# IRI's prefix straight off its last path segment
+
 TIMEOUT = 5  # HTTP timeout
+LOOKUP_DEADLINE = 8.0  # seconds for one term's whole fallback chain
+
+
+def _time_left(deadline: float) -> float:
+    """Timeout for the next request in a chain; LookupFailed once `deadline` has passed."""
+    left = deadline - time.monotonic()
+    if left <= 0.1:
+        raise LookupFailed("lookup deadline reached")
+    return min(TIMEOUT, left)
+
+# One pooled session for every lookup: keep-alive connections instead of a
+# TCP+TLS handshake per request, with retries on throttling/5xx.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+_SESSION.headers.update({"User-Agent": "AlethiOmics/1.0", "Accept-Encoding": "gzip, deflate"})
+
+# Requests inside a LOOKUP_DEADLINE chain: no adapter retries, which would
+# re-run a read timeout several times before the deadline is even checked.
+_DEADLINE_SESSION = requests.Session()
+_DEADLINE_SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=0))
+_DEADLINE_SESSION.headers.update(_SESSION.headers)
+
+# ─── Lookup cache ────────────────────────────────────────────────────────────
+# Ontology/taxonomy lookups are pure functions of their argument, so results
+# are kept in memory for the run and in a shelve file across runs.  Misses
+# (None) are re-queried sooner than hits.  A lookup that could not be
+# answered (network/HTTP error) raises LookupFailed instead and is not cached
+# at all, so an outage is never remembered as "no such id".
 
+CACHE_DIR    = Path(os.getenv("ALETHIOMICS_CACHE_DIR", "~/.cache/alethiomics")).expanduser()
+CACHE_TTL    = 30 * 24 * 3600   # seconds
+NEGATIVE_TTL = 24 * 3600
 
+_SHELF = None
+_SHELF_LOCK = threading.Lock()
+
+
+class LookupFailed(Exception):
+    """A remote lookup got no answer (transport or HTTP error)."""
+
+
+def _fetch(method: str, url: str, timeout: float, session=None, **kwargs) -> Optional[bytes]:
+    """Response body, or None for a 404; any other failure raises LookupFailed."""
+    try:
+        r = (session or _SESSION).request(method, url, timeout=timeout, **kwargs)
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.content
+    except requests.RequestException as exc:
+        raise LookupFailed(f"{method} {url}: {exc}") from exc
+
+
+def _shelf():
+    global _SHELF
+    if _SHELF is None:
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            _SHELF = shelve.open(str(CACHE_DIR / "ontology_lookups"))
+            atexit.register(_SHELF.close)
+        except Exception:
+            _SHELF = {}  # read-only home etc.: in-memory only
+    return _SHELF
+
+
+def _cache_get(skey: str, now: float):
+    """(True, value) for a shelf entry still within its TTL, else (False, None)."""
+    with _SHELF_LOCK:
+        hit = _shelf().get(skey)
+    if hit is not None:
+        stamp, value = hit
+        if now - stamp < (CACHE_TTL if value is not None else NEGATIVE_TTL):
+            return True, value
+    return False, None
+
+
+def _cache_put(skey: str, now: float, value) -> None:
+    with _SHELF_LOCK:
+        _shelf()[skey] = (now, value)
+
+
+def cached_fetcher(fn):
+    """Memoise a one-argument network lookup in memory and on disk.
+
+    `fn` raises LookupFailed when it got no answer; the wrapper then returns
+    None without storing anything.  `wrapper.fetch` is the cached lookup that
+    lets LookupFailed through, for lookups that chain into another one.
+    """
+    @lru_cache(maxsize=None)
+    def fetch(key: str):
+        skey = f"{fn.__name__}:{key}"
+        now = time.time()
+        found, value = _cache_get(skey, now)
+        if found:
+            return value
+        value = fn(key)  # LookupFailed propagates: neither lru nor shelf keep it
+        _cache_put(skey, now, value)
+        return value
+
+    @wraps(fn)
+    def wrapper(key: str):
+        try:
+            return fetch(key)
+        except LookupFailed:
+            return None
+    wrapper.fetch = fetch
+    wrapper.cache_clear = fetch.cache_clear
+    return wrapper
+
+
+@lru_cache(maxsize=65536)
 def normalize_ontology_id(id_str: str) -> Optional[Dict[str,str]]:
-    """Given a CURIE or full IRI, return standardized iri+curie+prefix or None."""
-    if id_str.startswith("http"):
-        iri = id_str
-        for pfx, base in PREFIX_TO_IRI.items():
-            if iri.startswith(base):
-                return {"iri": iri, "curie": f"{pfx}:{iri[len(base):]}", "prefix": pfx}
+    """Given a CURIE or full IRI, return standardized iri+curie+prefix or None.
+
+    Cached: every fetcher and several transforms normalize the same value, so
+    each distinct id is parsed once.  Treat the returned dict as read-only.
+    """
+    is_iri = id_str[:4] == "http"
+    if is_iri:
+        # ".../obo/CL_0000057" -> ("CL", "_", "0000057")
+        pfx, sep, local = id_str.rpartition("/")[2].partition("_")
+    else:
+        pfx, sep, local = id_str.partition(":")
+    # one dict lookup for either form; empty local ids are malformed
+    base = PREFIX_TO_IRI.get(pfx) if sep and local else None
+    if base is None:
         return None
-    
-    if ":" in id_str:
-        pfx, local = id_str.split(":", 1)
-        base = PREFIX_TO_IRI.get(pfx)
-        if not base:
+    if is_iri:
+        if not id_str.startswith(base):
             return None
-        return {"iri": base, "curie": id_str, "prefix": pfx}
-    return None
+        return {"iri": id_str, "curie": f"{pfx}:{local}", "prefix": pfx}
+    return {"iri": base + local, "curie": id_str, "prefix": pfx}
+
+# ─── Local ontology label index ──────────────────────────────────────────────
+# Labels from downloaded OBO releases (cl.obo, uberon.obo, ...) answer
+# get_name() without any HTTP.  Build once with `build_ontology_index(paths)`;
+# the pickled {CURIE: label} dict is reloaded when it is fresher than
+# ONT_INDEX_MAX_AGE.
+
+ONT_INDEX_PATH    = CACHE_DIR / "ontology_labels.pkl"
+ONT_INDEX_MAX_AGE = 30 * 24 * 3600
+
+
+def _parse_obo_labels(path: Path) -> Dict[str, str]:
+    """{id: name} for every [Term] stanza of an OBO file (plain or .gz)."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    labels: Dict[str, str] = {}
+    in_term = False
+    term_id = None
+    with opener(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            if line.startswith("["):
+                in_term = line.startswith("[Term]")
+                term_id = None
+            elif in_term and line.startswith("id: "):
+                term_id = line[4:].strip()
+            elif in_term and term_id and line.startswith("name: "):
+                labels[term_id] = line[6:].strip()
+    return labels
+
+
+def build_ontology_index(obo_paths) -> Dict[str, str]:
+    """Parse OBO files into one {CURIE: label} index and pickle it to ONT_INDEX_PATH."""
+    index: Dict[str, str] = {}
+    for path in obo_paths:
+        index.update(_parse_obo_labels(Path(path)))
+    ONT_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(ONT_INDEX_PATH, "wb") as fh:
+        pickle.dump(index, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    _ontology_index.cache_clear()
+    return index
+
+
+@lru_cache(maxsize=1)
+def _ontology_index() -> Dict[str, str]:
+    try:
+        if time.time() - ONT_INDEX_PATH.stat().st_mtime > ONT_INDEX_MAX_AGE:
+            return {}  # stale: rebuild from fresh releases
+        with open(ONT_INDEX_PATH, "rb") as fh:
+            return pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
 
 # ─── Fallback taxonomy rank via NCBI ─────────────────────────────────────────
 
+@cached_fetcher
 def ncbi_get_rank(taxon_id: str) -> Optional[str]:
     """Fetch taxonomic rank from NCBI taxonomy API."""
-    try:
-        url = f"https://api.ncbi.nlm.nih.gov/taxonomy/v0/id/{taxon_id}?format=json"
-        r = requests.get(url, timeout=TIMEOUT)
-        r.raise_for_status()
-        data = r.json()
-        return data.get('rank')
-    except Exception:
+    url = f"https://api.ncbi.nlm.nih.gov/taxonomy/v0/id/{taxon_id}?format=json"
+    content = _fetch("GET", url, TIMEOUT)
+    if content is None:
         return None
+    try:
+        return _loads(content).get('rank')
+    except ValueError as exc:
+        raise LookupFailed(f"{url}: {exc}") from exc
+
+OLS_TERM_CACHE = 4096
+_OLS_TERMS: Dict[str, Optional[Dict[str, Any]]] = {}
+_OLS_TERMS_LOCK = threading.Lock()
+
+
+def _ols_term(prefix: str, curie: str, deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """First OLS4 term record for `curie`, or None.
+
+    get_name / get_chem_class / get_ranking read different fields of the same
+    record, so it is fetched once per id and shared between them.  Only
+    answered lookups are memoised; failures raise LookupFailed, so a later
+    call retries.  With a `deadline` the request gets what is left of it and
+    goes through the no-retry session.
+    """
+    with _OLS_TERMS_LOCK:
+        if curie in _OLS_TERMS:
+            return _OLS_TERMS[curie]
+    url = f"https://www.ebi.ac.uk/ols4/api/ontologies/{prefix.lower()}/terms?obo_id={curie}"
+    if deadline is None:
+        content = _fetch("GET", url, TIMEOUT)
+    else:
+        content = _fetch("GET", url, _time_left(deadline), session=_DEADLINE_SESSION)
+    term = None
+    if content is not None:
+        try:
+            terms = _loads(content).get("_embedded", {}).get("terms", [])
+        except ValueError as exc:
+            raise LookupFailed(f"{url}: {exc}") from exc
+        term = terms[0] if terms else None
+    with _OLS_TERMS_LOCK:
+        if len(_OLS_TERMS) >= OLS_TERM_CACHE:
+            del _OLS_TERMS[next(iter(_OLS_TERMS))]  # oldest first
+        _OLS_TERMS[curie] = term
+    return term
+
+
+def _ols_term_or_failure(prefix: str, curie: str, deadline: Optional[float] = None) -> tuple:
+    """(term record or None, LookupFailed or None): lets a chain try its fallback first."""
+    try:
+        return _ols_term(prefix, curie, deadline), None
+    except LookupFailed as exc:
+        return None, exc
+
+# ─── Ontobee label batches ───────────────────────────────────────────────────
+# Ontobee answers one SPARQL query per IRI in get_name(); for prefixes that
+# fall through to it, harmonize() resolves all distinct IRIs up front with a
+# VALUES query per ONTOBEE_BATCH IRIs.  {iri: label or None} is consulted by
+# get_name() before any single-term request, and kept in the lookup cache
+# under "ontobee_label:<iri>" so later runs only query new IRIs.
+
+ONTOBEE_URL      = "https://www.ontobee.org/sparql"
+ONTOBEE_PREFIXES = frozenset({"HsapDv"})
+ONTOBEE_BATCH    = 200
+_ONTOBEE_LABELS: Dict[str, Optional[str]] = {}
+_SPARQL_JSON = {"Accept": "application/sparql-results+json"}
+_ONTOBEE_LABEL_QUERY = (
+    "PREFIX rdfs:<http://www.w3.org/2000/01/rdf-schema#>"
+    " SELECT ?label WHERE{{ <{}> rdfs:label ?label }} LIMIT 1"
+)
+
+
+def ontobee_labels_batch(iris: list) -> Dict[str, str]:
+    """Fetch rdfs:label for many IRIs in one SPARQL query; {iri: label}."""
+    values = " ".join(f"<{iri}>" for iri in iris)
+    sparql = (
+        "PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>"
+        f" SELECT ?iri ?label WHERE {{ VALUES ?iri {{ {values} }} ?iri rdfs:label ?label }}"
+    )
+    # POST: a few hundred IRIs do not fit in a query string
+    r = _SESSION.post(ONTOBEE_URL, data={"query": sparql, "output": "json"},
+                      headers=_SPARQL_JSON, timeout=TIMEOUT)
+    r.raise_for_status()
+    bindings = _loads(r.content).get("results", {}).get("bindings", [])
+    labels: Dict[str, str] = {}
+    for row in bindings:
+        labels.setdefault(row["iri"]["value"], row["label"]["value"])
+    return labels
+
+
+def prefetch_ontobee_labels(values) -> None:
+    """Batch-resolve Ontobee labels for the ONTOBEE_PREFIXES ids in `values`.
+
+    Ids get_name() or an earlier batch already has a fresh cache entry for are
+    skipped; misses are recorded too and expire after NEGATIVE_TTL.
+    """
+    index = _ontology_index()
+    now = time.time()
+    iris = {}
+    for val in values:
+        norm = normalize_ontology_id(val) if isinstance(val, str) else None
+        if not norm or norm["prefix"] not in ONTOBEE_PREFIXES:
+            continue
+        iri = norm["iri"]
+        if norm["curie"] in index or iri in _ONTOBEE_LABELS or iri in iris:
+            continue
+        if _cache_get(f"get_name:{val}", now)[0]:
+            continue
+        found, label = _cache_get(f"ontobee_label:{iri}", now)
+        if found:
+            _ONTOBEE_LABELS[iri] = label
+        else:
+            iris[iri] = None
+    iris = list(iris)
+    for start in range(0, len(iris), ONTOBEE_BATCH):
+        chunk = iris[start:start + ONTOBEE_BATCH]
+        try:
+            labels = ontobee_labels_batch(chunk)
+        except Exception:
+            continue  # leave them to the per-term fallback
+        for iri in chunk:
+            _ONTOBEE_LABELS[iri] = labels.get(iri)
+            _cache_put(f"ontobee_label:{iri}", now, _ONTOBEE_LABELS[iri])
+
+# ─── OLS label batches ───────────────────────────────────────────────────────
+# get_name() needs only the label, which the OLS4 search endpoint returns for
+# many obo_ids at once: one request per ontology and OLS_BATCH ids instead of
+# one term request each.  Results, misses included, are kept in the lookup
+# cache under "ols_label:<curie>"; a miss only stops the id from being
+# batched again, get_name() still tries the per-term _ols_term() lookup.
+
+OLS_SEARCH_URL = "https://www.ebi.ac.uk/ols4/api/search"
+OLS_BATCH      = 100
+_OLS_LABELS: Dict[str, Optional[str]] = {}
+
+
+def ols_labels_batch(prefix: str, curies: list) -> Dict[str, str]:
+    """Fetch labels for many CURIEs of one ontology; {curie: label}."""
+    r = _SESSION.get(OLS_SEARCH_URL, params={
+        "q": " ".join(curies),
+        "ontology": prefix.lower(),
+        "queryFields": "obo_id",
+        "fieldList": "obo_id,label",
+        "exact": "true",
+        "rows": len(curies),
+    }, timeout=TIMEOUT)
+    r.raise_for_status()
+    docs = _loads(r.content).get("response", {}).get("docs", [])
+    return {d["obo_id"]: d["label"] for d in docs if d.get("obo_id") and d.get("label")}
+
+
+def prefetch_ols_labels(values) -> None:
+    """Batch-resolve OLS labels for the ontology ids in `values`, per prefix.
+
+    Ids get_name() or an earlier batch already has a fresh cache entry for are
+    skipped; misses are recorded too and expire after NEGATIVE_TTL.
+    """
+    index = _ontology_index()
+    now = time.time()
+    by_prefix: Dict[str, dict] = {}
+    for val in values:
+        norm = normalize_ontology_id(val) if isinstance(val, str) else None
+        if not norm or norm["prefix"] in ONTOBEE_PREFIXES:
+            continue
+        curie = norm["curie"]
+        if curie in index or curie in _OLS_LABELS or curie in by_prefix.get(norm["prefix"], ()):
+            continue
+        if _cache_get(f"get_name:{val}", now)[0]:
+            continue
+        found, label = _cache_get(f"ols_label:{curie}", now)
+        if found:
+            _OLS_LABELS[curie] = label
+        else:
+            by_prefix.setdefault(norm["prefix"], {})[curie] = None
+    for prefix, curies in by_prefix.items():
+        curies = list(curies)
+        for start in range(0, len(curies), OLS_BATCH):
+            chunk = curies[start:start + OLS_BATCH]
+            try:
+                labels = ols_labels_batch(prefix, chunk)
+            except Exception:
+                continue  # leave them to the per-term lookup
+            for curie in chunk:
+                _OLS_LABELS[curie] = labels.get(curie)
+                _cache_put(f"ols_label:{curie}", now, _OLS_LABELS[curie])
 
 # ─── Transform functions registry ────────────────────────────────────────────
 
 def strip_version(val: str) -> str:
-    return re.sub(r"\.\d+$", "", val)
+    # drop a trailing ".<digits>"; plain str ops, no regex engine per call
+    head, dot, tail = val.rpartition(".")
+    return head if dot and tail.isdecimal() else val
 
 def canonical_iri(val: str) -> Optional[str]:
     gv = strip_version(val)
@@ -74,85 +441,105 @@ def get_iri(val: str) -> Optional[str]:
     norm = normalize_ontology_id(val)
     return norm["iri"] if norm else None
 
+@cached_fetcher
 def get_name(val: str) -> Optional[str]:
-    """Fetch term label from OLS4, fallback to Ontobee."""
+    """Fetch term label from the local OBO index, then OLS4, fallback to Ontobee."""
     norm = normalize_ontology_id(val)
     if not norm:
         return None
-    prefix = norm['prefix'].lower()
+    deadline = time.monotonic() + LOOKUP_DEADLINE
     curie = norm['curie']
+    label = _ontology_index().get(curie)
+    if label:
+        return label
+    label = _OLS_LABELS.get(curie)
+    if label:
+        return label
+    if norm['iri'] in _ONTOBEE_LABELS:
+        # resolved by a harmonize() batch, hit or miss
+        return _ONTOBEE_LABELS[norm['iri']]
     # primary: OLS4
-    try:
-        url = f"https://www.ebi.ac.uk/ols4/api/ontologies/{prefix}/terms?obo_id={curie}"
-        r = requests.get(url, timeout=TIMEOUT)
-        r.raise_for_status()
-        terms = r.json().get("_embedded", {}).get("terms", [])
-        if terms and terms[0].get("label"):
-            return terms[0]["label"]
-    except Exception:
-        pass
-    # fallback: Ontobee SPARQL
-    try:
-        sparql = (
-            f"PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>"
-            f" SELECT ?label WHERE {{ <{norm['iri']}> rdfs:label ?label }}"
-        )
-        ob_url = "https://www.ontobee.org/sparql"
-        r2 = requests.get(ob_url, params={'query': sparql, 'output': 'json'}, timeout=TIMEOUT)
-        r2.raise_for_status()
-        bindings = r2.json().get('results', {}).get('bindings', [])
-        if bindings:
-            return bindings[0]['label']['value']
-    except Exception:
-        pass
+    term, failed = _ols_term_or_failure(norm['prefix'], curie, deadline)
+    if term and term.get("label"):
+        return term["label"]
+    # fallback: Ontobee SPARQL, within what is left of the deadline (once it
+    # has passed, LookupFailed keeps the unfinished chain out of the cache)
+    content = _fetch("POST", ONTOBEE_URL, _time_left(deadline), session=_DEADLINE_SESSION,
+                     headers=_SPARQL_JSON,
+                     data={'query': _ONTOBEE_LABEL_QUERY.format(norm['iri']), 'output': 'json'})
+    bindings = []
+    if content is not None:
+        try:
+            bindings = _loads(content).get('results', {}).get('bindings', [])
+        except ValueError as exc:
+            raise LookupFailed(f"{ONTOBEE_URL}: {exc}") from exc
+    if bindings:
+        return bindings[0]['label']['value']
+    if failed:
+        raise failed  # OLS never answered: not a confirmed miss
     return None
 
+def _chebi_ascii_name(xml: bytes) -> Optional[str]:
+    """Text of the first <chebiAsciiName> in a ChEBI SOAP response.
+
+    Streams the document and stops at the match instead of building the whole
+    tree; elements already seen are cleared as it goes.
+    """
+    for _, elem in ElementTree.iterparse(io.BytesIO(xml), events=("end",)):
+        if elem.tag.endswith("chebiAsciiName"):
+            return elem.text.strip() if elem.text else None
+        elem.clear()
+    return None
+
+@cached_fetcher
 def get_chem_class(val: str) -> Optional[str]:
     """Fetch CHEBI classification via OLS4 annotation, fallback to XML service."""
+    deadline = time.monotonic() + LOOKUP_DEADLINE
     norm = normalize_ontology_id(val)
+    failed = None
     if norm:
-        try:
-            url = f"https://www.ebi.ac.uk/ols4/api/ontologies/{norm['prefix'].lower()}/terms?obo_id={norm['curie']}"
-            r = requests.get(url, timeout=TIMEOUT)
-            r.raise_for_status()
-            ann = r.json().get("_embedded", {}).get("terms", [])[0].get("annotation", {})
-            if ann.get('chebi_class'):
-                return ann['chebi_class'][0]
-        except Exception:
-            pass
-    try:
-        chebi_id = val.split(':',1)[1]
-        url = f"https://www.ebi.ac.uk/webservices/chebi/2.0/test/getCompleteEntity?chebiId={chebi_id}&format=xml"
-        r2 = requests.get(url, timeout=TIMEOUT)
-        r2.raise_for_status()
-        doc = xmltodict.parse(r2.text)
-        return doc['S:Envelope']['S:Body']["getCompleteEntityResponse"]["return"]["chebiAsciiName"].strip()
-    except Exception:
+        term, failed = _ols_term_or_failure(norm['prefix'], norm['curie'], deadline)
+        ann = (term.get("annotation") or {}) if term else {}
+        if ann.get('chebi_class'):
+            return ann['chebi_class'][0]
+    # the normalized CURIE also covers values given as full CHEBI IRIs
+    chebi_id = (norm['curie'] if norm else val).partition(':')[2]
+    if not chebi_id:
+        if failed:
+            raise failed
         return None
+    url = f"https://www.ebi.ac.uk/webservices/chebi/2.0/test/getCompleteEntity?chebiId={chebi_id}&format=xml"
+    content = _fetch("GET", url, _time_left(deadline), session=_DEADLINE_SESSION)
+    name = None
+    if content is not None:
+        try:
+            name = _chebi_ascii_name(content)
+        except ElementTree.ParseError as exc:
+            raise LookupFailed(f"{url}: {exc}") from exc
+    if name is None and failed:
+        raise failed  # OLS never answered: not a confirmed miss
+    return name
 
+@cached_fetcher
 def get_ranking(val: str) -> Optional[str]:
     """Query taxonomy rank via OLS4, fallback to NCBI taxonomy API."""
     norm = normalize_ontology_id(val)
     if not norm:
         return None
-    prefix = norm['prefix'].lower()
-    curie = norm['curie']
-    # primary: OLS4 annotation 'has_rank'
-    try:
-        url = f"https://www.ebi.ac.uk/ols4/api/ontologies/{prefix}/terms?obo_id={curie}"
-        r = requests.get(url, timeout=TIMEOUT)
-        r.raise_for_status()
-        ann = r.json().get("_embedded", {}).get("terms", [])[0].get("annotation", {})
-        if ann.get('has_rank'):
-            rank = ann['has_rank']
-            return rank[0] if isinstance(rank, list) else rank
-    except Exception:
-        pass
+    # primary: OLS4 annotation 'has_rank' (same term record get_name read)
+    term, failed = _ols_term_or_failure(norm['prefix'], norm['curie'])
+    ann = (term.get("annotation") or {}) if term else {}
+    if ann.get('has_rank'):
+        rank = ann['has_rank']
+        return rank[0] if isinstance(rank, list) else rank
     # fallback: NCBI taxonomy
+    rank = None
     if norm['prefix'] == 'NCBITaxon':
-        taxid = norm['curie'].split(':',1)[1]
-        return ncbi_get_rank(taxid)
-    return None
+        # .fetch: an NCBI outage must not be cached as get_ranking's miss
+        rank = ncbi_get_rank.fetch(norm['curie'].partition(':')[2])
+    if rank is None and failed:
+        raise failed  # OLS never answered: not a confirmed miss
+    return rank
 
 def get_ontology(val: str) -> Optional[str]:
     norm = normalize_ontology_id(val)
@@ -189,35 +576,129 @@ def load_mapping(path:Path="config/features.yml") -> Dict[str,Any]:
 #         out = fn(out)
 #     return {"table": entry["target_table"], "column": entry["target_column"], "value": out}
 
+# transforms that block on an HTTP round-trip; values going through any of
+# them are resolved concurrently on a shared thread pool
+NETWORK_TRANSFORMS = frozenset({"get_name", "get_chem_class", "get_ranking"})
+HTTP_WORKERS = 16
+_POOL: Optional[ThreadPoolExecutor] = None
+
+
+def _http_pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(max_workers=HTTP_WORKERS, thread_name_prefix="harmonise-http")
+    return _POOL
+
+
+_INDEX_CACHE: Dict[int, tuple] = {}
+
+
+def _column_index(mapping: Dict[str,Any]) -> Dict[str, Dict[str,Any]]:
+    """
+    {source column: mapping entry} for every column that exactly one mapping
+    key ends with (".<column>"); ambiguous columns are left out.  Built once
+    per mapping dict instead of scanning all keys for every item.
+    """
+    hit = _INDEX_CACHE.get(id(mapping))
+    if hit is not None and hit[0] is mapping:
+        return hit[1]
+    counts: Dict[str, int] = {}
+    owner: Dict[str, str] = {}
+    for key in mapping["columns"]:
+        # every ".<suffix>" of the key is a column name it answers to
+        pos = key.find(".")
+        while pos != -1:
+            suffix = key[pos + 1:]
+            counts[suffix] = counts.get(suffix, 0) + 1
+            owner[suffix] = key
+            pos = key.find(".", pos + 1)
+    index = {col: mapping["columns"][owner[col]] for col, n in counts.items() if n == 1}
+    _INDEX_CACHE.clear()  # mappings are loaded once per run
+    _INDEX_CACHE[id(mapping)] = (mapping, index)
+    return index
+
+
+def _bind_transforms(transforms: list) -> tuple:
+    """Resolve transform names to functions once per column (unknown names are skipped)."""
+    return tuple(TRANSFORM_FUNCS[t] for t in transforms if t in TRANSFORM_FUNCS)
+
+
+def _apply_transforms(fns: tuple, val: Any) -> Any:
+    # apply transforms in order
+    out = val
+    for fn in fns:
+        out = fn(out)
+    return out
+
+
 def harmonize(item_or_list: Any, mapping: Dict[str,Any]) -> Dict[tuple, set]:
    """
    Accepts a single {column,value} or a list thereof,
    applies transforms, and returns a dict:
      { (table, column): set(values) }
+   ColumnBatch objects (see extract(legacy=False)) are accepted too; the
+   mapping entry is then resolved once for the whole batch.
+   Values whose transforms hit the network are resolved concurrently.
    """
    # normalize to list
    items = item_or_list if isinstance(item_or_list, list) else [item_or_list]
-   from collections import defaultdict
-   grouped: Dict[tuple, set] = defaultdict(set)
+   column_index = _column_index(mapping)
+   # first pass: collect the distinct values per source column, so repeated
+   # values (very common in obs columns) are transformed only once
+   pending: Dict[str, tuple] = {}
    for item in items:
-       col = item.get("column")
-       val = item.get("value")
+       if isinstance(item, dict):
+           col = item.get("column")
+           vals = (item.get("value"),)
+       else:
+           # ColumnBatch from extract(legacy=False): dedupe in Arrow/pandas
+           # before any Python objects are built
+           col = item.column
+           vals = item.distinct()
        if col is None:
            continue
        # find the mapping entry
-       candidates = [k for k in mapping["columns"] if k.endswith(f".{col}")]
-       if len(candidates) != 1:
+       entry = column_index.get(col)
+       if entry is None:
            continue
-       entry = mapping["columns"][candidates[0]]
-       # apply transforms in order
-       out = val
-       for tname in entry.get("transforms", []):
-           fn = TRANSFORM_FUNCS.get(tname)
-           if fn:
-               out = fn(out)
-       # accumulate by (table, column)
+       if col not in pending:
+           pending[col] = (entry, {})
+       pending[col][1].update(dict.fromkeys(vals))
+   return _transform_pending(pending)
+
+
+def harmonize_frame(df: Any, mapping: Dict[str,Any]) -> Dict[tuple, set]:
+   """
+   Column-wise harmonize() for a whole DataFrame (e.g. an obs/var table):
+   each mapped column is deduplicated with one vectorised unique() instead of
+   being fed through harmonize() one {column,value} dict per cell.  Missing
+   cells are skipped.  Returns the same { (table, column): set(values) }.
+   """
+   column_index = _column_index(mapping)
+   pending: Dict[str, tuple] = {}
+   for col in df.columns:
+       entry = column_index.get(col)
+       if entry is not None:
+           pending[col] = (entry, dict.fromkeys(df[col].dropna().unique().tolist()))
+   return _transform_pending(pending)
+
+
+def _transform_pending(pending: Dict[str, tuple]) -> Dict[tuple, set]:
+   """Second pass of harmonize(): transform each distinct value once."""
+   grouped: Dict[tuple, set] = defaultdict(set)
+   for entry, uniq in pending.values():
        key = (entry["target_table"], entry["target_column"])
-       grouped[key].add(out)
+       transforms = entry.get("transforms", [])
+       fns = _bind_transforms(transforms)
+       if "get_name" in transforms:
+           prefetch_ols_labels(uniq)
+           prefetch_ontobee_labels(uniq)
+       if len(uniq) > 1 and NETWORK_TRANSFORMS.intersection(transforms):
+           outs = _http_pool().map(partial(_apply_transforms, fns), uniq)
+       else:
+           outs = (_apply_transforms(fns, val) for val in uniq)
+       # accumulate by (table, column)
+       grouped[key].update(outs)
    return grouped
 
 # ─── CLI harness ─────────────────────────────────────────────────────────────
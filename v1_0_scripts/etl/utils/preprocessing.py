@@ -28,6 +28,8 @@ def strip_version(gene_id: Union[str, None]) -> Optional[str]:
     gene_id = gene_id.strip()
     if not gene_id:
         return None
+    if "." not in gene_id:
+        return gene_id         # nothing to strip; skip the regex engine
 
     m = _ENS_VERSION_RE.match(gene_id)
     if m:
@@ -87,12 +89,15 @@ PUNCT_MAP = {
     "×": "x",  "·": ".",  "±": "+/-", "µ": "u", "°": "deg",
     "\u00A0": " ",
 }
-_PUNCT_REGEX = re.compile("|".join(map(re.escape, PUNCT_MAP)))
-_greek_pattern = re.compile("|".join(map(re.escape, GREEK_TO_ASCII)))
+# every key is a single code point, so str.translate does the whole
+# substitution in one C pass (no regex alternation, no per-match callback)
+_PUNCT_TABLE = str.maketrans(PUNCT_MAP)
+_GREEK_TABLE = str.maketrans(GREEK_TO_ASCII)
+_WS_RE = re.compile(r"\s+")
 
 def tidy_punct(text: str) -> str:
     """Translate non-ASCII punctuation to ASCII equivalents."""
-    return _PUNCT_REGEX.sub(lambda m: PUNCT_MAP[m.group(0)], text)
+    return text.translate(_PUNCT_TABLE)
 
 
 def ascii_slug(text: str) -> str | None:
@@ -104,9 +109,9 @@ def ascii_slug(text: str) -> str | None:
         return None
 
     # 1) swap Greek letters for their ASCII names
-    text = _greek_pattern.sub(lambda m: GREEK_TO_ASCII[m.group(0)], text)
+    text = text.translate(_GREEK_TABLE)
 
-    return re.sub(r"\s+", " ", text).strip().lower()
+    return _WS_RE.sub(" ", text).strip().lower()
 
 def lowercase_ascii(text: Optional[str]) -> Optional[str]:
     """
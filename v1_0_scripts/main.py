@@ -56,14 +56,16 @@ discover_dir = "raw_data"
 logfile = create_timestamped_filename("./debug_logs")
 print_and_log(f"Looking for files in directory: {discover_dir}\n")
 
+# parsed once for the whole run, not per discovered file
+mapping = load_mapping("config/features.yml")
+
 for path in discvr.discover(discover_dir):
     from etl.extract import extract
     from etl.load import load   
     from etl.harmonise import harmonize
     from etl.utils.preprocessing import lowercase_ascii
     
-    mapping = load_mapping("config/features.yml")
-    for row in extract(path, mapping, mode='metadata'):
+    for row in extract(path, mapping, mode='metadata', legacy=False):
         
         # , add_timestamp=False, logfile_path=logfile, collapse_size=3
         # row["value"] = lowercase_ascii(str(row["value"]) if row["value"] is not None else "") 